@@ -0,0 +1,337 @@
+"""Declarative advisory rules and the engine that evaluates them.
+
+Every advisory line comes from a slot. A slot checks its rules top to bottom
+and emits the lines of the first rule whose conditions all hold, or its
+default when none do. A slot with ``unless`` stays silent when any of the
+named slots emitted something (e.g. the "standard backpack" fallback).
+
+The same tables drive two evaluators: ``evaluate_row`` for one set of
+conditions (what the page renders) and ``evaluate_columns`` /
+``evaluate_batch`` for NumPy or pandas columns with one row per location or
+hour, for batch jobs.
+"""
+import operator
+import re
+from collections import namedtuple
+
+Rule = namedtuple('Rule', 'when say')
+Slot = namedtuple('Slot', 'name rules default unless', defaults=((), ()))
+
+OPS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# Input columns; dew_point is derived from temp and humidity
+COLUMNS = ('temp', 'feels_like', 'humidity', 'wind', 'rain', 'is_day', 'uv_index', 'weather_code', 'aqi')
+
+DAYTIME = ('is_day', '!=', 0)
+
+# WARDROBE
+OUTFIT = [
+    Slot('base', [
+        Rule([('feels_like', '<', 5)], ("❄️ Base: Thermal innerwear + Woolen sweater + Heavy Coat.",)),
+        Rule([('feels_like', '<', 12)], ("🧥 Base: Puffer jacket or Heavy trench coat.",)),
+        Rule([('feels_like', '<', 18)], ("🧣 Base: Hoodie, Cardigan, or Denim jacket.",)),
+        Rule([('feels_like', '<', 25)], ("👕 Base: Long-sleeve t-shirt or Flannels.",)),
+        Rule([('feels_like', '<', 30)], ("👚 Base: Breathable cotton or linen. Short sleeves.",)),
+    ], ("🎽 Base: Loose-fit synthetics. Shorts/Skirts permitted.",)),
+    Slot('footwear', [
+        Rule([('rain', '>', 0.5)], ("👢 Shoes: Waterproof boots or gumboots. Avoid suede.",)),
+        Rule([('rain', '>', 0)], ("👟 Shoes: Water-resistant leather sneakers. No canvas..",)),
+        Rule([('temp', '>', 30)], ("👡 Shoes: Open-toe sandals or breathable mesh trainers.",)),
+        Rule([('feels_like', '<', 10)], ("🧦 Shoes: Insulated boots with thick wool socks.",)),
+    ], ("👞 Shoes: Comfortable loafers or casual sneakers.",)),
+    Slot('fabric', [
+        Rule([('temp', '>', 28), DAYTIME], (
+            "🎨 Style: Wear light colors (white/beige) to reflect heat.",
+            "🧵 Fabric: Opt for 100% Linen or Cotton.",
+        )),
+        Rule([('feels_like', '<', 15)], (
+            "🎨 Style: Dark colors absorb heat better today.",
+            "🧵 Fabric: Fleece, Wool, or Cashmere blends.",
+        )),
+    ], (
+        "🎨 Style: Any color works today.",
+        "🧵 Fabric: Comfortable cotton blends or light layers.",
+    )),
+    Slot('rain_gear', [
+        Rule([('rain', '>', 0), ('wind', '>', 20)], ("🚫 Warning: Wind is too strong for umbrellas! Use a raincoat.",)),
+        Rule([('rain', '>', 0)], ("☂️ Gear: Carry a sturdy umbrella.",)),
+    ]),
+    Slot('sun_gear', [
+        Rule([('uv_index', '>', 5), DAYTIME], ("🕶️ Extras: Polarized sunglasses & wide-brim hat required.",)),
+    ]),
+    Slot('extras', [], ("🎒 Extras: A standard backpack or handbag is sufficient.",), unless=('rain_gear', 'sun_gear')),
+]
+
+# SELF CARE
+HYGIENE = [
+    Slot('skin', [
+        Rule([('humidity', '<', 35)], ("🧴 Skin: Dry air alert. Use oil-based moisturizer & lip balm.",)),
+        Rule([('humidity', '>', 75)], ("🧼 Skin: High humidity. Use gel-based moisturizer. Carry blotting paper.",)),
+    ], ("✨ Skin: Balanced humidity. Standard lotion is fine.",)),
+    Slot('spf', [
+        Rule([('uv_index', '>=', 8), DAYTIME], ("🛡️ SPF: Extreme UV. Apply SPF 50+ every 2 hours.",)),
+        Rule([('uv_index', '>=', 5), DAYTIME], ("🛡️ SPF: High UV. Apply SPF 30+ before stepping out.",)),
+        Rule([DAYTIME], ("🛡️ SPF: Low UV. Daily SPF 15 moisturizer is sufficient.",)),
+    ], ("🌙 Care: No UV concern. Focus on night-time skincare routine.",)),
+    Slot('hair', [
+        Rule([('dew_point', '>', 20)], ("🦁 Hair: Severe Frizz Alert! Use anti-humidity serum.",)),
+    ]),
+    Slot('eyes', [
+        Rule([('wind', '>', 20), DAYTIME], ("👁️ Eyes: Windy & bright. Wear sunglasses to prevent dry eyes.",)),
+    ]),
+    Slot('hair_eyes', [], ("👀 Eyes & Hair: Conditions are mild. Standard care applies.",), unless=('hair', 'eyes')),
+    Slot('hydration', [
+        Rule([('temp', '>', 30)], ("🥤 Hydration: Add electrolytes to your water today.",)),
+        Rule([('temp', '<', 15)], ("🍵 Hydration: Warm herbal teas will keep you hydrated.",)),
+    ], ("💧 Hydration: Maintain distinct daily water intake (approx 2.5L).",)),
+]
+
+# LIFESTYLE
+LIFESTYLE = [
+    Slot('exercise', [
+        Rule([('aqi', '<', 50), ('rain', '==', 0)], ("🏃 Exercise: Perfect conditions for an outdoor run.",)),
+        Rule([('rain', '>', 0)], ("🧘 Exercise: Rainy day. Try Yoga or Calisthenics indoors.",)),
+        Rule([('aqi', '>=', 100)], ("😷 Health: Air is poor. Gym workout only. Wear mask outdoors.",)),
+    ], ("💪 Exercise: Weather is neutral. Good for a gym session or light jog.",)),
+    Slot('diet', [
+        Rule([('temp', '>', 32)], ("🥗 Diet: Eat cooling foods like cucumber, melons, and salads.",)),
+        Rule([('temp', '<', 15)], ("🍲 Diet: Hearty soups and root vegetables recommended.",)),
+    ], ("🍎 Diet: Balanced weather. Great time for fresh fruits and veggies.",)),
+    Slot('focus', [
+        Rule([('rain', '>', 0)], ("🎧 Focus: Gloomy weather is perfect for deep work. Use lo-fi beats.",)),
+        Rule([('weather_code', '>', 50)], ("🎧 Focus: Gloomy weather is perfect for deep work. Use lo-fi beats.",)),
+        Rule([DAYTIME, ('temp', '>', 20), ('temp', '<', 30)], ("💡 Focus: Great weather! Take walking meetings if possible.",)),
+    ], ("✨ Mood: Steady weather. Good for clearing your backlog.",)),
+    Slot('home', [
+        Rule([('humidity', '>', 70)], ("🏠 Home: Run a dehumidifier or AC dry mode to prevent mold.",)),
+        Rule([('humidity', '<', 30)], ("🏠 Home: Air is dry. Use a humidifier for better sleep.",)),
+    ], ("🏠 Home: Indoor climate is comfortable. Open windows for fresh air.",)),
+]
+
+# DAILY ROUTINE
+ROUTINE = [
+    Slot('morning', [
+        Rule([('rain', '>', 0)], ("07:00 AM - 🧘 Indoor Yoga (Rainy Start)",)),
+        Rule([('aqi', '<', 50)], ("07:00 AM - 🏃 Morning Run (Clean Air)",)),
+    ], ("07:00 AM - 🏋️ Gym Workout / Stretching",)),
+    Slot('commute', [
+        Rule([('rain', '>', 0.5)], ("08:30 AM - 🚗 Leave 20m early (Traffic)",)),
+    ], ("08:45 AM - 🚇 Regular Commute",)),
+    Slot('lunch', [
+        Rule([('temp', '>', 30)], ("01:00 PM - 🥗 Light Salad Lunch (Heat)",)),
+        Rule([('temp', '<', 15)], ("01:00 PM - 🍜 Hot Soup & Sandwich",)),
+    ], ("01:00 PM - 🍱 Balanced Healthy Lunch",)),
+    Slot('break', [
+        Rule([('temp', '>', 28)], ("03:00 PM - 🥤 Hydration Break (Iced Tea)",)),
+    ], ("03:00 PM - ☕ Coffee/Tea Break",)),
+    Slot('evening', [
+        Rule([('rain', '==', 0), ('temp', '>', 15), ('temp', '<', 27)], ("06:30 PM - 🚶 Evening Walk / Park",)),
+        Rule([('aqi', '>', 100)], ("06:30 PM - 🏠 Indoor Hobby (Bad Air)",)),
+    ], ("06:30 PM - 📖 Reading / Relaxation",)),
+]
+
+
+def _clock_minutes(line):
+    """Minutes past midnight of the "08:30 AM" a routine line starts with."""
+    hour, minute, meridiem = re.match(r"(\d\d):(\d\d) ([AP]M)", line).groups()
+    return int(hour) % 12 * 60 + int(minute) + (720 if meridiem == 'PM' else 0)
+
+
+# Local time of day each routine slot happens at, in minutes: the earliest
+# time its lines name, so the timeline judges the hour the advice is about
+ROUTINE_MINUTES = {
+    slot.name: min(_clock_minutes(line) for lines in [*(rule.say for rule in slot.rules), slot.default]
+                   for line in lines)
+    for slot in ROUTINE
+}
+
+SECTIONS = {
+    'outfit': OUTFIT,
+    'hygiene': HYGIENE,
+    'lifestyle': LIFESTYLE,
+    'routine': ROUTINE,
+}
+
+
+def dew_point(temp, humidity):
+    return temp - ((100 - humidity) / 5)
+
+
+def row_from_conditions(current, daily, aqi):
+    """Map Open-Meteo ``current``/``daily`` blocks onto the rule columns."""
+    return {
+        'temp': current['temperature_2m'],
+        'feels_like': current['apparent_temperature'],
+        'humidity': current['relative_humidity_2m'],
+        'wind': current['wind_speed_10m'],
+        'rain': current['precipitation'],
+        'is_day': current['is_day'],
+        'uv_index': daily['uv_index_max'][0],
+        'weather_code': current['weather_code'],
+        'aqi': aqi,
+    }
+
+
+# Open-Meteo hourly variables backing each rule column
+HOURLY_COLUMNS = {
+    'temp': 'temperature_2m',
+    'feels_like': 'apparent_temperature',
+    'humidity': 'relative_humidity_2m',
+    'wind': 'wind_speed_10m',
+    'rain': 'precipitation',
+    'is_day': 'is_day',
+    'uv_index': 'uv_index',
+    'weather_code': 'weather_code',
+}
+
+
+def has_hourly_columns(hourly):
+    return all(variable in hourly for variable in HOURLY_COLUMNS.values())
+
+
+def hourly_columns(hourly, aqi):
+    """Build rule columns from an hourly forecast block, one row per hour.
+
+    Only the current AQI is known, so it is used for every hour.
+    """
+    import numpy as np
+
+    columns = {column: np.asarray(hourly[variable], dtype=float) for column, variable in HOURLY_COLUMNS.items()}
+    columns['aqi'] = np.full(len(hourly['time']), aqi, dtype=float)
+    return columns
+
+
+# Scalar evaluation
+
+def _matches(when, row):
+    return all(OPS[op](row[column], value) for column, op, value in when)
+
+
+def evaluate_slot(slot, row, emitted):
+    if any(emitted.get(name) for name in slot.unless):
+        return ()
+    for rule in slot.rules:
+        if _matches(rule.when, row):
+            return rule.say
+    return slot.default
+
+
+def evaluate_row(row):
+    """Evaluate every section for one mapping of column values."""
+    row = dict(row, dew_point=dew_point(row['temp'], row['humidity']))
+    emitted = {}
+    advisory = {}
+    for section, slots in SECTIONS.items():
+        lines = []
+        for slot in slots:
+            say = evaluate_slot(slot, row, emitted)
+            emitted[slot.name] = bool(say)
+            lines.extend(say)
+        advisory[section] = lines
+    return advisory
+
+
+# Vectorized evaluation
+
+def _slot_options(slot):
+    # Index len(rules) is the default, len(rules) + 1 means suppressed by ``unless``
+    return [rule.say for rule in slot.rules] + [slot.default, ()]
+
+
+def evaluate_columns(columns, sections=None):
+    """Pick a rule for every slot over whole columns at once.
+
+    ``columns`` maps each name in COLUMNS to a 1-D array (a pandas DataFrame
+    works as is). Returns ``{slot name: int array}`` of option indices into
+    ``_slot_options(slot)``, for all sections or just the ones named.
+    """
+    import numpy as np
+
+    cols = {name: np.asarray(columns[name], dtype=float) for name in COLUMNS}
+    cols['dew_point'] = dew_point(cols['temp'], cols['humidity'])
+    size = len(cols['temp'])
+
+    choices = {}
+    emitted = {}
+    for section in sections or SECTIONS:
+        for slot in SECTIONS[section]:
+            choice = np.full(size, len(slot.rules), dtype=np.intp)
+            # Apply rules last to first so the first matching rule wins
+            for index in range(len(slot.rules) - 1, -1, -1):
+                matched = None
+                for column, op, value in slot.rules[index].when:
+                    test = OPS[op](cols[column], value)
+                    matched = test if matched is None else matched & test
+                choice[matched] = index
+            for name in slot.unless:
+                choice[emitted[name]] = len(slot.rules) + 1
+            nonempty = np.array([bool(say) for say in _slot_options(slot)])
+            emitted[slot.name] = nonempty[choice]
+            choices[slot.name] = choice
+    return choices
+
+
+def evaluate_batch(columns):
+    """Evaluate all rows and return one advisory dict per row."""
+    choices = evaluate_columns(columns)
+    plan = [
+        (section, [(_slot_options(slot), choices[slot.name].tolist()) for slot in slots])
+        for section, slots in SECTIONS.items()
+    ]
+    size = len(next(iter(choices.values()))) if choices else 0
+    advisories = []
+    for i in range(size):
+        advisory = {}
+        for section, slot_choices in plan:
+            lines = []
+            for options, picked in slot_choices:
+                lines.extend(options[picked[i]])
+            advisory[section] = lines
+        advisories.append(advisory)
+    return advisories
+
+
+def hourly_routine(hourly, aqi, day=0, utc_offset=0, now=None):
+    """Build the routine for one forecast day, each slot judged on its own hour.
+
+    ``hourly['time']`` holds epoch seconds; ``utc_offset`` shifts them to the
+    location's wall clock, which is what the slot times refer to. A slot is
+    judged on the hourly row nearest its time, so an 08:30 slot uses 09:00,
+    whose precipitation covers 08:00-09:00.
+
+    Given ``now`` (epoch seconds), each slot is its next occurrence from then
+    on, ``day`` days later: a slot already past today is judged on tomorrow.
+    Lines come in the order the slots happen. Without ``now``, ``day`` counts
+    the days the hourly block covers. All hours are evaluated in a single
+    vectorized pass. Returns None when the hourly block doesn't cover them.
+    """
+    import numpy as np
+
+    local = np.asarray(hourly['time'], dtype=np.int64) + utc_offset
+    if now is None:
+        days = np.unique(local // 86400)
+        if day >= len(days):
+            return None
+        occurrences = [int(days[day]) * 86400 + ROUTINE_MINUTES[slot.name] * 60 for slot in ROUTINE]
+    else:
+        local_now = int(now) + utc_offset
+        occurrences = []
+        for slot in ROUTINE:
+            at = local_now // 86400 * 86400 + ROUTINE_MINUTES[slot.name] * 60
+            occurrences.append(at + (day + (at < local_now)) * 86400)
+    positions = {t: i for i, t in enumerate(local.tolist())}
+    hours = [positions.get((at + 1800) // 3600 * 3600) for at in occurrences]
+    if None in hours:
+        return None
+    choices = evaluate_columns(hourly_columns(hourly, aqi), sections=('routine',))
+    lines = []
+    for _, slot, i in sorted(zip(occurrences, ROUTINE, hours), key=lambda entry: entry[0]):
+        lines.extend(_slot_options(slot)[choices[slot.name][i]])
+    return lines
@@ -0,0 +1,217 @@
+"""Headless JSON API for WeatherWise advisories, as a plain ASGI app.
+
+Run it with any ASGI server, e.g.::
+
+    uvicorn api_server:app --workers 4
+
+Endpoints:
+
+* ``GET /advisory?city=Bengaluru`` or ``GET /advisory?lat=12.97&lon=77.59``
+* ``POST /advisory/batch`` with ``{"locations": [{"city": "Paris"}, {"lat": 1.3, "lon": 103.8}]}``
+* ``GET /healthz``
+* ``GET /metrics`` - Prometheus text format
+
+It shares weather_core, and so the same cross-process cache, with the
+Streamlit page.
+"""
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import metrics
+import weather_core
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_LOCATIONS = 1000
+MAX_BODY_BYTES = 1 << 20
+# Cities of one batch geocoded at once; only offline-index misses go upstream
+GEOCODE_CONCURRENCY = 16
+
+# Fetches and cache reads block, so they run off the event loop
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="weatherwise-api")
+# A batch's geocoding fans out here; a pool of its own, since the batch
+# itself runs on _executor and must not wait on its own workers
+_geocode_executor = ThreadPoolExecutor(max_workers=GEOCODE_CONCURRENCY, thread_name_prefix="weatherwise-api-geocode")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def parse_location(query):
+    """Turn ``{"city": ...}`` or ``{"lat": ..., "lon": ...}`` into a location dict."""
+    if not isinstance(query, dict):
+        raise HTTPError(400, "each location must be an object with 'city' or 'lat' and 'lon'")
+    if query.get('city'):
+        return {'city': str(query['city'])}
+    try:
+        lat = float(query['lat'])
+        lon = float(query['lon'])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPError(400, "each location needs 'city' or numeric 'lat' and 'lon'")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPError(400, "coordinates out of range")
+    return {'name': None, 'latitude': lat, 'longitude': lon}
+
+
+def resolve(location):
+    if 'city' not in location:
+        return location
+    return weather_core.get_lat_lon(location['city'])
+
+
+@metrics.timed('api_advisory')
+def advisory_for(query):
+    location = resolve(parse_location(query))
+    if location is None:
+        raise HTTPError(404, f"city '{query['city']}' not found")
+    results, errors = weather_core.get_weather_and_aqi(location['latitude'], location['longitude'], location.get('elevation'))
+    if 'forecast' in errors:
+        raise HTTPError(502, f"forecast unavailable: {errors['forecast']}")
+    return weather_core.advisory_report(location, results['forecast'], results.get('air_quality'))
+
+
+@metrics.timed('api_batch')
+def _geocode(city):
+    """get_lat_lon for one city of a batch; an upstream failure is returned
+    rather than raised, so it fails that item only."""
+    try:
+        return weather_core.get_lat_lon(city)
+    except Exception as e:
+        if not weather_core.weather_client.is_upstream_error(e):
+            raise
+        return e
+
+
+def advisories_for(queries):
+    if not isinstance(queries, list) or not queries:
+        raise HTTPError(400, "'locations' must be a non-empty list")
+    if len(queries) > MAX_BATCH_LOCATIONS:
+        raise HTTPError(413, f"at most {MAX_BATCH_LOCATIONS} locations per batch")
+
+    parsed = [parse_location(query) for query in queries]
+    # Geocode each distinct city once, concurrently
+    cities = list({location['city']: None for location in parsed if 'city' in location})
+    resolved = dict(zip(cities, _geocode_executor.map(_geocode, cities)))
+    locations = [resolved[location['city']] if 'city' in location else location for location in parsed]
+
+    found = [location for location in locations if isinstance(location, dict)]
+    if found:
+        results, errors = weather_core.get_conditions_batch(found)
+        if 'forecast' in errors:
+            raise HTTPError(502, f"forecast unavailable: {errors['forecast']}")
+        forecasts = iter(results['forecast'])
+        air_quality = iter(results.get('air_quality') or [None] * len(found))
+
+    reports = []
+    for query, location in zip(queries, locations):
+        if location is None:
+            reports.append({'query': query, 'error': "not found"})
+        elif isinstance(location, Exception):
+            reports.append({'query': query, 'error': f"geocoding failed: {location}"})
+        else:
+            reports.append(weather_core.advisory_report(location, next(forecasts), next(air_quality)))
+    return {'results': reports}
+
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body.extend(message.get('body', b''))
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "request body too large")
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+async def route(scope, receive):
+    method, path = scope['method'], scope['path']
+    loop = asyncio.get_running_loop()
+    if path == "/healthz" and method == "GET":
+        return 200, {
+            'status': "ok",
+            'cache': weather_core.weather_cache.get_cache().stats(),
+            'upstream': weather_core.weather_client.circuit_states(),
+        }
+    if path == "/metrics" and method == "GET":
+        return 200, metrics.render()
+    if path == "/advisory" and method == "GET":
+        query = {k: v[0] for k, v in parse_qs(scope['query_string'].decode()).items()}
+        return 200, await loop.run_in_executor(_executor, advisory_for, query)
+    if path == "/advisory/batch" and method == "POST":
+        try:
+            body = json.loads(await read_body(receive))
+        except ValueError:
+            raise HTTPError(400, "body must be JSON")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        return 200, await loop.run_in_executor(_executor, advisories_for, body.get('locations'))
+    if path in ("/healthz", "/metrics", "/advisory", "/advisory/batch"):
+        raise HTTPError(405, "method not allowed")
+    raise HTTPError(404, "not found")
+
+
+async def send_body(send, status, body, content_type):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type.encode()),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+    await send_body(send, status, body, "application/json; charset=utf-8")
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _executor.shutdown(wait=False)
+            _geocode_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    try:
+        status, payload = await route(scope, receive)
+    except HTTPError as e:
+        status, payload = e.status, {'error': e.message}
+    except Exception as e:
+        if weather_core.weather_client.is_upstream_error(e):
+            logger.warning("Upstream failed for %s: %s", scope['path'], e)
+            status, payload = 502, {'error': f"upstream unavailable: {e}"}
+        else:
+            logger.exception("Unhandled error for %s", scope['path'])
+            status, payload = 500, {'error': "internal server error"}
+    if isinstance(payload, str):
+        # Only /metrics answers with text
+        await send_body(send, status, payload.encode(), metrics.CONTENT_TYPE)
+    else:
+        await send_json(send, status, payload)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("api_server:app", host="0.0.0.0", port=8000)
@@ -0,0 +1,348 @@
+"""Append-only local archive of fetched conditions, for trend views.
+
+Every upstream forecast and air-quality response is appended here per grid
+cell, so "warmer than yesterday" and weekly AQI charts come from disk rather
+than from new API calls. Layout::
+
+    <root>/<cell>/<YYYYMMDD>.<kind>.log   rows appended as they are fetched
+    <root>/<cell>/<YYYYMMDD>.<kind>.dat   the same day once compacted
+
+Each file is a flat array of fixed-width little-endian records read through
+``np.memmap``, partitioned by UTC day of the row's timestamp, so a 30-day
+range for one location opens about 30 small files. Appends are single
+``O_APPEND`` writes, safe across worker processes; a torn trailing record is
+ignored by readers.
+
+Kinds:
+
+* ``current`` - the current block, one row per fetch
+* ``hourly`` - the hourly forecast from an hour before to a day after it
+  was issued; queries keep the latest issue for each hour
+* ``aqi`` - current European AQI, one row per fetch
+
+Policy: days older than COMPACT_AFTER_DAYS are rewritten once as
+``.dat`` (``current`` and ``aqi`` downsampled to the last row per hour,
+``hourly`` to the latest issue per hour) and days older than
+RETENTION_DAYS are deleted. Both run when a cell starts a new day's
+partition, and a sweep over every cell, including ones nobody fetches any
+more, follows in the background at most once per SWEEP_INTERVAL across all
+processes sharing the root. There is no separate job to schedule; to run a
+sweep by hand::
+
+    python archive.py sweep
+
+``WEATHERWISE_ARCHIVE=0`` disables recording; ``WEATHERWISE_ARCHIVE_DIR``
+moves it (default ``data/archive`` next to this file).
+"""
+import argparse
+import functools
+import logging
+import os
+import threading
+import time
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("WEATHERWISE_ARCHIVE", "1") != "0"
+DEFAULT_ROOT = os.environ.get(
+    "WEATHERWISE_ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "archive"),
+)
+
+RETENTION_DAYS = 90
+COMPACT_AFTER_DAYS = 2
+# Hourly rows kept from each forecast, relative to its issue time
+HOURLY_WINDOW = (-3600, 86400)
+
+# Seconds between sweeps of the whole root, and the file that records the last one
+SWEEP_INTERVAL = 3600
+SWEEP_MARKER = ".last-sweep"
+
+DAY = 86400
+HOUR = 3600
+EPOCH_DATE = date(1970, 1, 1)
+
+FIELDS = {
+    'current': ('temperature_2m', 'apparent_temperature', 'relative_humidity_2m', 'precipitation',
+                'wind_speed_10m', 'weather_code', 'is_day'),
+    'hourly': ('temperature_2m', 'apparent_temperature', 'precipitation_probability', 'precipitation',
+               'relative_humidity_2m', 'wind_speed_10m', 'uv_index', 'weather_code'),
+    'aqi': ('european_aqi',),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def schema(kind):
+    """Record dtype for ``kind``; 'time' (and 'issued' for hourly) are epoch seconds."""
+    import numpy as np
+
+    times = [('time', '<i8')] + ([('issued', '<i8')] if kind == 'hourly' else [])
+    return np.dtype(times + [(name, '<f4') for name in FIELDS[kind]])
+
+
+def cell_name(lat, lon):
+    return f"{lat:+08.3f}_{lon:+09.3f}"
+
+
+class Archive:
+    def __init__(self, root=DEFAULT_ROOT, retention_days=RETENTION_DAYS, compact_after_days=COMPACT_AFTER_DAYS,
+                 sweep_interval=SWEEP_INTERVAL):
+        self.root = root
+        self.retention_days = retention_days
+        self.compact_after_days = compact_after_days
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+
+    # Writing
+
+    def record_forecast(self, lat, lon, forecast):
+        """Append the current block and the near-term hourly rows of a forecast_model.Forecast."""
+        import numpy as np
+
+        issued = forecast.current.time
+        current = np.zeros(1, dtype=schema('current'))
+        current['time'] = issued
+        for name in FIELDS['current']:
+            current[name] = _number(forecast.current[name])
+        self._append(lat, lon, 'current', current)
+
+        times = np.asarray(forecast.hourly.get('time', ()), dtype=np.int64)
+        keep = (times >= issued + HOURLY_WINDOW[0]) & (times < issued + HOURLY_WINDOW[1])
+        hourly = np.zeros(int(keep.sum()), dtype=schema('hourly'))
+        hourly['time'] = times[keep]
+        hourly['issued'] = issued
+        for name in FIELDS['hourly']:
+            values = forecast.hourly.get(name)
+            hourly[name] = values[keep] if values is not None else np.nan
+        self._append(lat, lon, 'hourly', hourly)
+
+    def record_air_quality(self, lat, lon, data):
+        """Append the current AQI from one decoded air-quality response."""
+        import numpy as np
+
+        current = data.get('current') or {}
+        if 'time' not in current:
+            return
+        row = np.zeros(1, dtype=schema('aqi'))
+        row['time'] = np.datetime64(current['time'], 's').astype(np.int64) - data.get('utc_offset_seconds', 0)
+        row['european_aqi'] = _number(current.get('european_aqi'))
+        self._append(lat, lon, 'aqi', row)
+
+    def _append(self, lat, lon, kind, rows):
+        # Like the cache, a broken archive must never fail the fetch that fed it
+        try:
+            self._write(lat, lon, kind, rows)
+        except Exception as e:
+            logger.warning("Archive write failed for %s at %s,%s: %s", kind, lat, lon, e)
+
+    def _write(self, lat, lon, kind, rows):
+        if not len(rows):
+            return
+        directory = os.path.join(self.root, cell_name(lat, lon))
+        days = rows['time'] // DAY
+        new_partition = False
+        for day in sorted(set(days.tolist())):
+            path = os.path.join(directory, f"{_day_name(day)}.{kind}.log")
+            if not os.path.exists(path):
+                os.makedirs(directory, exist_ok=True)
+                new_partition = True
+            data = rows[days == day].tobytes()
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+        if new_partition:
+            self.maintain(directory)
+            threading.Thread(target=self._sweep_quietly, name="archive-sweep", daemon=True).start()
+
+    # Compaction and retention
+
+    def maintain(self, directory):
+        """Compact finished days and drop expired ones for one cell."""
+        today = int(time.time()) // DAY
+        with self._lock:
+            for filename in sorted(os.listdir(directory)):
+                parts = filename.split('.')
+                if len(parts) != 3:
+                    continue
+                day_name, kind, suffix = parts
+                age = today - _parse_day(day_name)
+                path = os.path.join(directory, filename)
+                if age > self.retention_days:
+                    _remove(path)
+                elif suffix == 'log' and age > self.compact_after_days and kind in FIELDS:
+                    self._compact(path, kind)
+
+    def sweep(self):
+        """maintain() every cell under the root; returns how many there were."""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return 0
+        cells = 0
+        for name in sorted(names):
+            directory = os.path.join(self.root, name)
+            if os.path.isdir(directory):
+                self.maintain(directory)
+                cells += 1
+        return cells
+
+    def sweep_if_due(self):
+        """sweep() unless a process sharing the root did within sweep_interval."""
+        marker = os.path.join(self.root, SWEEP_MARKER)
+        now = time.time()
+        try:
+            if now - os.path.getmtime(marker) < self.sweep_interval:
+                return False
+        except FileNotFoundError:
+            os.makedirs(self.root, exist_ok=True)
+        # Claimed before sweeping, so writers arriving meanwhile skip it
+        with open(marker, 'a'):
+            pass
+        os.utime(marker, (now, now))
+        self.sweep()
+        return True
+
+    def _sweep_quietly(self):
+        try:
+            self.sweep_if_due()
+        except Exception as e:
+            logger.warning("Archive sweep of %s failed: %s", self.root, e)
+
+    def _compact(self, path, kind):
+        order = 'issued' if kind == 'hourly' else 'time'
+        target = path[:-len('log')] + 'dat'
+        parts = [_read(path, kind)]
+        if os.path.exists(target):
+            parts.insert(0, _read(target, kind))
+        rows = _latest_per_hour(_concat(parts), order)
+        temporary = f"{target}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(rows.tobytes())
+        os.replace(temporary, target)
+        _remove(path)
+
+    # Reading
+
+    def query(self, kind, lat, lon, start, end):
+        """Rows of ``kind`` for the cell with ``start <= time < end``, sorted by time.
+
+        Hourly rows are reduced to the latest issue for each hour.
+        """
+        import numpy as np
+
+        directory = os.path.join(self.root, cell_name(lat, lon))
+        try:
+            existing = set(os.listdir(directory))
+        except FileNotFoundError:
+            existing = set()
+        parts = []
+        for day in range(int(start) // DAY, (int(end) - 1) // DAY + 1):
+            for suffix in ('dat', 'log'):
+                filename = f"{_day_name(day)}.{kind}.{suffix}"
+                if filename in existing:
+                    parts.append(_read(os.path.join(directory, filename), kind))
+        if not parts:
+            return np.zeros(0, dtype=schema(kind))
+        rows = _concat(parts)
+        rows = rows[(rows['time'] >= start) & (rows['time'] < end)]
+        if kind == 'hourly':
+            return _latest_per_hour(rows, 'issued')
+        return rows[np.argsort(rows['time'], kind='stable')]
+
+
+def daily_means(rows, field, utc_offset=0):
+    """Mean of ``field`` per local calendar day: (datetime64[D] days, float means)."""
+    import numpy as np
+
+    if not len(rows):
+        return np.zeros(0, dtype='datetime64[D]'), np.zeros(0)
+    values = rows[field].astype(float)
+    valid = ~np.isnan(values)
+    local_days = (rows['time'][valid] + utc_offset) // DAY
+    days, index = np.unique(local_days, return_inverse=True)
+    sums = np.bincount(index, weights=values[valid])
+    counts = np.bincount(index)
+    return days.astype('datetime64[D]'), sums / counts
+
+
+def _number(value):
+    return float('nan') if value is None else value
+
+
+def _day_name(day):
+    return time.strftime("%Y%m%d", time.gmtime(day * DAY))
+
+
+def _parse_day(name):
+    return (date(int(name[:4]), int(name[4:6]), int(name[6:8])) - EPOCH_DATE).days
+
+
+def _read(path, kind):
+    import numpy as np
+
+    dtype = schema(kind)
+    # Ignore a record torn by a concurrent append
+    count = os.path.getsize(path) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+def _concat(parts):
+    import numpy as np
+
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def _latest_per_hour(rows, order):
+    """Last row per hour by ``order`` (then file order), sorted by hour."""
+    import numpy as np
+
+    if not len(rows):
+        return rows
+    hours = rows['time'] // HOUR
+    ranked = np.lexsort((np.arange(len(rows)), rows[order], hours))
+    ranked_hours = hours[ranked]
+    last = np.append(ranked_hours[1:] != ranked_hours[:-1], True)
+    return rows[ranked[last]]
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """Return the process-wide archive, or None when disabled."""
+    global _archive
+    if not ENABLED:
+        return None
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = Archive()
+    return _archive
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WeatherWise conditions archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sweep = sub.add_parser("sweep", help="compact finished days and drop expired ones in every cell")
+    sweep.add_argument("--root", default=DEFAULT_ROOT)
+    args = parser.parse_args(argv)
+
+    cells = Archive(args.root).sweep()
+    print(f"Swept {cells} cells under {args.root}")
+
+
+if __name__ == "__main__":
+    main()
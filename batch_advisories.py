@@ -0,0 +1,289 @@
+"""Batch mode: advisories for a whole subscriber list, e.g. a morning digest.
+
+    python batch_advisories.py subscribers.csv -o digest.jsonl
+    python batch_advisories.py subscribers.csv -o digest.parquet --workers 8
+
+The input is CSV with ``user`` and ``city`` columns (or the first two
+columns when there is no such header), or JSONL with those keys. Work is
+proportional to the distinct cities, not to the rows:
+
+1. one pass over the input collects the distinct cities (by normalized name)
+2. they are geocoded concurrently, offline index first, and deduplicated
+   again into forecast grid cells
+3. cells are fetched in batched requests through the shared cache, and as
+   each batch arrives its advisories are computed on a process pool
+4. a second pass over the input streams one output row per input row
+
+Memory holds one report per cell and one location per city; rows are never
+all in memory. Output is JSONL (a row per input row, shaped like the API's
+batch results plus ``user`` and ``city``) or Parquet with one column per
+field, written a row group at a time. Parquet needs pyarrow.
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import forecast_model
+import geocoder
+import ratelimit
+import weather_cache
+import weather_client
+import weather_core
+
+logger = logging.getLogger(__name__)
+
+GEOCODE_CONCURRENCY = 16
+# Batched forecast + AQI requests in flight at once
+FETCH_CONCURRENCY = 4
+# Rows per Parquet row group
+ROW_GROUP_ROWS = 65536
+# How advisory worker processes start; never fork, see build_reports
+MP_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+CURRENT_COLUMNS = (
+    'temperature_2m', 'apparent_temperature', 'relative_humidity_2m', 'precipitation', 'wind_speed_10m', 'weather_code',
+)
+SECTIONS = ('outfit', 'hygiene', 'lifestyle', 'routine')
+
+
+def read_rows(path):
+    """Yield (user, city) from a CSV or JSONL file, streaming."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield str(row.get('user', '')), str(row.get('city', ''))
+            return
+        reader = csv.reader(f)
+        first = next(reader, None)
+        if first is None:
+            return
+        header = [name.strip().casefold() for name in first]
+        if 'user' in header and 'city' in header:
+            user_at, city_at = header.index('user'), header.index('city')
+        else:
+            user_at, city_at = 0, 1
+            yield first[user_at], first[city_at]
+        for row in reader:
+            if len(row) > max(user_at, city_at):
+                yield row[user_at], row[city_at]
+
+
+def distinct_cities(path):
+    """Normalized name -> first spelling seen, plus the row count."""
+    cities = {}
+    rows = 0
+    for _, city in read_rows(path):
+        rows += 1
+        cities.setdefault(geocoder.normalize(city), city)
+    return cities, rows
+
+
+def geocode(cities, concurrency=GEOCODE_CONCURRENCY):
+    """Normalized name -> location dict, or an error string."""
+    def resolve(city):
+        try:
+            with ratelimit.background():
+                return weather_core.get_lat_lon(city) or "not found"
+        except Exception as e:
+            return f"geocoding failed: {e}"
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-geocode") as pool:
+        return dict(zip(cities, pool.map(resolve, cities.values())))
+
+
+def fetch_cells(cells):
+    """Encoded forecasts and AQI responses for one batch of cells."""
+    # Like get_conditions_batch, but a digest can wait for a slow AQI batch,
+    # and its requests yield to page views in the shared rate limit
+    with ratelimit.background():
+        results, errors = weather_client.fetch_parallel({
+            'forecast': (weather_core.get_weather_batch, cells),
+            'air_quality': (weather_core.get_aqi_batch, cells),
+        })
+    if 'forecast' in errors:
+        raise errors['forecast']
+    if 'air_quality' in errors:
+        logger.warning("Air quality failed for %d cells, using last known values: %s", len(cells), errors['air_quality'])
+        air_quality = weather_core.last_known_aqi(cells)
+    else:
+        air_quality = results['air_quality']
+    return [forecast_model.encode(forecast) for forecast in results['forecast']], air_quality
+
+
+def advise(payloads):
+    """Process-pool worker: a location-less advisory report per (encoded forecast, AQI response)."""
+    reports = []
+    for payload, air_quality in payloads:
+        report = weather_core.advisory_report(None, forecast_model.decode(payload), air_quality)
+        del report['location']
+        reports.append(report)
+    return reports
+
+
+def build_reports(cells, workers=None, fetch_concurrency=FETCH_CONCURRENCY):
+    """Cell -> report dict or error string, fetching and advising batch by batch."""
+    cells = sorted(cells)
+    batches = [cells[start:start + weather_client.MAX_BATCH] for start in range(0, len(cells), weather_client.MAX_BATCH)]
+    reports = {}
+    # Workers start on the first submit, while fetch threads may hold locks
+    # (metrics, logging, SQLite) a forked child would inherit locked forever;
+    # forkserver children start clean
+    with ThreadPoolExecutor(max_workers=fetch_concurrency, thread_name_prefix="batch-fetch") as fetchers, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(MP_START_METHOD)) as pool:
+        fetches = {fetchers.submit(fetch_cells, batch): batch for batch in batches}
+        advising = {}
+        # Hand each batch to the pool as soon as it arrives, so fetching and
+        # advising overlap and only in-flight batches hold forecasts. A
+        # finished future still holds its result, so each is dropped once used.
+        for future in as_completed(fetches):
+            batch = fetches.pop(future)
+            try:
+                forecasts, air_quality = future.result()
+            except Exception as e:
+                logger.warning("Forecast fetch failed for %d cells: %s", len(batch), e)
+                reports.update(dict.fromkeys(batch, f"forecast unavailable: {e}"))
+                continue
+            advising[pool.submit(advise, list(zip(forecasts, air_quality)))] = batch
+        for future in as_completed(advising):
+            reports.update(zip(advising.pop(future), future.result()))
+    return reports
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self._file = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8')
+        # Rows repeat a handful of cities and cells, so their JSON is built once
+        self._fragments = {}
+
+    def _fragment(self, key, value):
+        fragment = self._fragments.get(key)
+        if fragment is None:
+            fragment = self._fragments[key] = json.dumps(value, ensure_ascii=False, separators=(',', ':'))[1:-1]
+        return fragment
+
+    def write(self, user, city, city_key, location, cell, report):
+        head = json.dumps({'user': user, 'city': city}, ensure_ascii=False, separators=(',', ':'))[:-1]
+        if isinstance(report, str):
+            body = json.dumps({'error': report}, ensure_ascii=False, separators=(',', ':'))[1:-1]
+        else:
+            body = ",".join((
+                self._fragment(('location', city_key), {'location': location}),
+                self._fragment(('cell', cell), report),
+            ))
+        self._file.write(f"{head},{body}}}\n")
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, row_group_rows=ROW_GROUP_ROWS):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow (pip install pyarrow); use a .jsonl output instead")
+        self._pa = pa
+        self.schema = pa.schema(
+            [('user', pa.string()), ('city', pa.string()), ('error', pa.string()),
+             ('name', pa.string()), ('country', pa.string()), ('latitude', pa.float64()), ('longitude', pa.float64()),
+             ('aqi', pa.float64()), ('aqi_status', pa.string()), ('aqi_last_known_at', pa.int64())]
+            + [(name, pa.float64()) for name in CURRENT_COLUMNS]
+            + [(section, pa.list_(pa.string())) for section in SECTIONS]
+        )
+        self._writer = pq.ParquetWriter(path, self.schema)
+        self.row_group_rows = row_group_rows
+        self._columns = {name: [] for name in self.schema.names}
+
+    def write(self, user, city, city_key, location, cell, report):
+        row = dict.fromkeys(self.schema.names)
+        row['user'] = user
+        row['city'] = city
+        if isinstance(report, str):
+            row['error'] = report
+        else:
+            row.update(name=location['name'], country=location.get('country'),
+                       latitude=location['latitude'], longitude=location['longitude'],
+                       aqi=report['aqi'], aqi_status=report['aqi_status'],
+                       aqi_last_known_at=report['aqi_last_known_at'])
+            for name in CURRENT_COLUMNS:
+                row[name] = report['current'][name]
+            row.update(report['advisory'])
+        for name, value in row.items():
+            self._columns[name].append(value)
+        if len(self._columns['user']) >= self.row_group_rows:
+            self._flush()
+
+    def _flush(self):
+        if self._columns['user']:
+            self._writer.write_table(self._pa.Table.from_pydict(self._columns, schema=self.schema))
+            self._columns = {name: [] for name in self.schema.names}
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def run(input_path, output_path, workers=None, fetch_concurrency=FETCH_CONCURRENCY, output_format=None):
+    """Run the whole batch; returns summary counts for the log line."""
+    start = time.perf_counter()
+    cities, rows = distinct_cities(input_path)
+    locations = geocode(cities)
+    cell_for_city = {
+        key: weather_cache.grid_cell(location['latitude'], location['longitude'])
+        for key, location in locations.items() if isinstance(location, dict)
+    }
+    reports = build_reports(set(cell_for_city.values()), workers, fetch_concurrency)
+
+    if output_format is None:
+        output_format = 'parquet' if output_path.endswith('.parquet') else 'jsonl'
+    writer = ParquetWriter(output_path) if output_format == 'parquet' else JsonlWriter(output_path)
+    failed = 0
+    try:
+        for user, city in read_rows(input_path):
+            key = geocoder.normalize(city)
+            location = locations[key]
+            cell = cell_for_city.get(key)
+            report = reports[cell] if cell is not None else location
+            failed += isinstance(report, str)
+            writer.write(user, city, key, location, cell, report)
+    finally:
+        writer.close()
+    return {
+        'rows': rows,
+        'cities': len(cities),
+        'cells': len(reports),
+        'failed_rows': failed,
+        'seconds': round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute WeatherWise advisories for a subscriber list")
+    parser.add_argument("input", help="CSV or JSONL with user and city")
+    parser.add_argument("-o", "--output", default="-", help="output .jsonl or .parquet file, '-' for stdout (JSONL)")
+    parser.add_argument("--format", choices=('jsonl', 'parquet'), help="override the format implied by --output")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="advisory worker processes")
+    parser.add_argument("--fetch-concurrency", type=int, default=FETCH_CONCURRENCY,
+                        help=f"batched upstream requests in flight ({weather_client.MAX_BATCH} cells each)")
+    args = parser.parse_args()
+    if args.format == 'parquet' and args.output == '-':
+        parser.error("Parquet output needs a file")
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s", stream=sys.stderr)
+    summary = run(args.input, args.output, args.workers, args.fetch_concurrency, args.format)
+    logger.info("Wrote %(rows)d rows for %(cities)d cities in %(cells)d cells "
+                "(%(failed_rows)d failed) in %(seconds)ss", summary)
+
+
+if __name__ == "__main__":
+    main()
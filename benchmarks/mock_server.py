@@ -0,0 +1,230 @@
+"""Local stand-in for the Open-Meteo geocoding, forecast and air-quality APIs.
+
+Replays the recorded payloads in benchmarks/payloads/ with configurable
+latency, jitter and error rate, so the fetch layer can be measured offline:
+
+    python benchmarks/mock_server.py serve --port 8765 --latency 0.08 --jitter 0.03 --error-rate 0.01
+
+and point the app at it:
+
+    WEATHERWISE_GEOCODING_URL=http://127.0.0.1:8765/v1/search
+    WEATHERWISE_FORECAST_URL=http://127.0.0.1:8765/v1/forecast
+    WEATHERWISE_AIR_QUALITY_URL=http://127.0.0.1:8765/v1/air-quality
+
+Batched requests (comma-separated latitude/longitude) get one replayed
+payload per point, as a list, the way Open-Meteo answers them. ``GET
+/__stats`` returns request counts per endpoint; ``POST /__reset`` zeroes
+them. ``--rate-limit N`` enforces a quota of N requests per second per
+endpoint, answering the excess with 429 and ``Retry-After: 1``.
+
+``python benchmarks/mock_server.py record`` refreshes the payloads from the
+real APIs with the app's current request parameters.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "payloads")
+
+ENDPOINTS = {
+    "/v1/search": 'geocoding',
+    "/v1/forecast": 'forecast',
+    "/v1/air-quality": 'air_quality',
+}
+
+
+def load_payloads(directory=PAYLOAD_DIR):
+    payloads = {}
+    for endpoint in ENDPOINTS.values():
+        with open(os.path.join(directory, f"{endpoint}.json"), encoding="utf-8") as f:
+            payloads[endpoint] = json.load(f)
+    return payloads
+
+
+class PointTemplate:
+    """A recorded single-point response, pre-encoded so replaying it for any
+    coordinate is a byte splice rather than a JSON dump."""
+
+    def __init__(self, payload):
+        rest = {k: v for k, v in payload.items() if k not in ('latitude', 'longitude')}
+        self.tail = json.dumps(rest, ensure_ascii=False, separators=(',', ':')).encode()[1:]
+
+    def render(self, lat, lon):
+        return b'{"latitude":%s,"longitude":%s,%s' % (lat.encode(), lon.encode(), self.tail)
+
+
+class MockOpenMeteo(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, rate_limit=0,
+                 payloads=None):
+        super().__init__(address, MockHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit = rate_limit
+        # endpoint -> (second, requests in it)
+        self.windows = {}
+        payloads = payloads or load_payloads()
+        self.places = {place['name'].casefold(): place for place in payloads['geocoding']['results']}
+        self.templates = {
+            'forecast': PointTemplate(payloads['forecast']),
+            'air_quality': PointTemplate(payloads['air_quality']),
+        }
+        self.counts = dict.fromkeys(ENDPOINTS.values(), 0)
+        self.counts['errors'] = 0
+        self.counts['throttled'] = 0
+        self.counts_lock = threading.Lock()
+        self.random = random.Random()
+
+    def count(self, name):
+        with self.counts_lock:
+            self.counts[name] += 1
+
+    def over_quota(self, endpoint):
+        if not self.rate_limit:
+            return False
+        second = int(time.time())
+        with self.counts_lock:
+            window, count = self.windows.get(endpoint, (second, 0))
+            count = count + 1 if window == second else 1
+            self.windows[endpoint] = (second, count)
+        return count > self.rate_limit
+
+    def delay(self):
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def geocoding(self, query):
+        place = self.places.get(" ".join(query.get('name', [""])[0].split()).casefold())
+        if place is None:
+            return json.dumps({'generationtime_ms': 0.3}).encode()
+        return json.dumps({'results': [place], 'generationtime_ms': 0.3}, ensure_ascii=False).encode()
+
+    def points(self, endpoint, query):
+        lats = query['latitude'][0].split(',')
+        lons = query['longitude'][0].split(',')
+        template = self.templates[endpoint]
+        bodies = [template.render(lat, lon) for lat, lon in zip(lats, lons)]
+        return bodies[0] if len(bodies) == 1 else b'[' + b','.join(bodies) + b']'
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', "application/json")
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        server = self.server
+        if url.path == "/__stats":
+            with server.counts_lock:
+                self.send_body(200, json.dumps(server.counts).encode())
+            return
+        endpoint = ENDPOINTS.get(url.path)
+        if endpoint is None:
+            self.send_body(404, b'{"error":true,"reason":"Not Found"}')
+            return
+        server.count(endpoint)
+        if server.over_quota(endpoint):
+            server.count('throttled')
+            self.send_body(429, b'{"error":true,"reason":"Too many requests"}', {'Retry-After': "1"})
+            return
+        time.sleep(server.delay())
+        if server.random.random() < server.error_rate:
+            server.count('errors')
+            self.send_body(server.error_status, b'{"error":true,"reason":"mock failure"}')
+            return
+        query = parse_qs(url.query)
+        try:
+            if endpoint == 'geocoding':
+                body = server.geocoding(query)
+            else:
+                body = server.points(endpoint, query)
+        except (KeyError, ValueError):
+            self.send_body(400, b'{"error":true,"reason":"bad parameters"}')
+            return
+        self.send_body(200, body)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/__reset":
+            self.send_body(404, b'{"error":true,"reason":"Not Found"}')
+            return
+        with self.server.counts_lock:
+            for name in self.server.counts:
+                self.server.counts[name] = 0
+        self.send_body(200, b'{}')
+
+
+def start(port=0, **options):
+    """Run a mock server on a background thread; returns it (``server.server_port``)."""
+    server = MockOpenMeteo(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, name="mock-open-meteo", daemon=True).start()
+    return server
+
+
+def record(city, directory=PAYLOAD_DIR):
+    """Fetch fresh payloads from the real APIs with the app's request parameters."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import weather_client
+
+    location = weather_client.fetch_location(city)
+    if location is None:
+        raise SystemExit(f"city '{city}' not found")
+    recorded = {
+        'forecast': weather_client.fetch_forecast(location['latitude'], location['longitude']),
+        'air_quality': weather_client.fetch_air_quality(location['latitude'], location['longitude']),
+    }
+    for endpoint, payload in recorded.items():
+        with open(os.path.join(directory, f"{endpoint}.json"), "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        print(f"recorded {endpoint} for {location['name']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Open-Meteo stand-in")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="serve the recorded payloads")
+    serve.add_argument("--port", type=int, default=8765, help="0 picks a free port")
+    serve.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    serve.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of uniform noise on the latency")
+    serve.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    serve.add_argument("--error-status", type=int, default=503)
+    serve.add_argument("--rate-limit", type=int, default=0, help="requests per second per endpoint, 0 for none")
+    record_parser = commands.add_parser('record', help="refresh payloads from the real APIs")
+    record_parser.add_argument("city", nargs="?", default="Bengaluru")
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.city)
+        return
+    server = MockOpenMeteo(
+        ("127.0.0.1", args.port), latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, error_status=args.error_status, rate_limit=args.rate_limit,
+    )
+    # First line is the bound port so a parent process can read it
+    print(server.server_port, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
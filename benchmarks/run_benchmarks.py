@@ -0,0 +1,272 @@
+"""End-to-end page-view benchmark against the local Open-Meteo stand-in.
+
+Starts benchmarks/mock_server.py in a subprocess, points the fetch layer at
+it, and replays page views (geocode, forecast + AQI, advisory) for cities
+drawn from a Zipf popularity curve over the recorded places. Each run has a
+``cold`` phase on an empty cache and a ``warm`` phase on the same cache.
+
+    python benchmarks/run_benchmarks.py --views 2000 --concurrency 16 --output bench.json
+    python benchmarks/run_benchmarks.py --compare bench.json
+
+Results are JSON (commit, config and per-phase p50/p99 latency, throughput,
+upstream calls per page view, failures and peak RSS, plus the cost and
+payload size of each chart path for one forecast), so two commits can be
+compared with --compare.
+
+The run leaves no state behind and reads none: the archive and the
+prefetcher are off and the rate limiter is in memory (ISOLATED_ENV), unless
+those variables are already set.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+PHASES = ('cold', 'warm')
+COMPARED = ('p50_ms', 'p99_ms', 'throughput_per_s', 'upstream_calls_per_view')
+CHART_COMPARED = ('build_ms', 'rerun_ms', 'payload_bytes')
+CHART_REPEATS = 50
+
+# Keeps benchmark runs out of data/archive, the prefetch budget and the
+# rate-limit buckets shared with real traffic on this machine
+ISOLATED_ENV = {
+    'WEATHERWISE_ARCHIVE': "0",
+    'WEATHERWISE_PREFETCH': "0",
+    'WEATHERWISE_RATE_LIMIT_DB': "memory",
+}
+
+
+def start_mock(args):
+    mock = subprocess.Popen(
+        [
+            sys.executable, os.path.join(BENCH_DIR, "mock_server.py"), "serve", "--port", "0",
+            "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+        ],
+        stdout=subprocess.PIPE, text=True,
+    )
+    port = int(mock.stdout.readline())
+    return mock, f"http://127.0.0.1:{port}"
+
+
+def mock_request(base_url, path, method="GET"):
+    with urlopen(Request(base_url + path, method=method), timeout=5) as response:
+        return json.loads(response.read())
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def popular_cities(count, skew):
+    with open(os.path.join(BENCH_DIR, "payloads", "geocoding.json"), encoding="utf-8") as f:
+        places = json.load(f)['results']
+    places.sort(key=lambda place: place['population'], reverse=True)
+    names = [place['name'] for place in places[:count]]
+    weights = [1 / rank ** skew for rank in range(1, len(names) + 1)]
+    return names, weights
+
+
+def page_view(city):
+    """What one Streamlit rerun of the main view does, minus the rendering."""
+    import weather_core
+
+    start = time.perf_counter()
+    location = weather_core.get_lat_lon(city)
+    if location is None:
+        raise LookupError(f"city '{city}' not found")
+    results, errors = weather_core.get_weather_and_aqi(location['latitude'], location['longitude'])
+    if 'forecast' in errors:
+        raise errors['forecast']
+    weather_core.forecast_advisory(results['forecast'], weather_core.current_aqi(results.get('air_quality')))
+    return time.perf_counter() - start
+
+
+def run_phase(base_url, cities, concurrency):
+    mock_request(base_url, "/__reset", method="POST")
+    latencies = []
+    failures = 0
+
+    def timed_view(city):
+        try:
+            return page_view(city)
+        except Exception:
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency in pool.map(timed_view, cities):
+            if latency is None:
+                failures += 1
+            else:
+                latencies.append(latency)
+    elapsed = time.perf_counter() - start
+
+    upstream = mock_request(base_url, "/__stats")
+    latencies.sort()
+    calls = sum(upstream[name] for name in ('geocoding', 'forecast', 'air_quality'))
+    return {
+        'views': len(cities),
+        'failures': failures,
+        'seconds': round(elapsed, 3),
+        'throughput_per_s': round(len(cities) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3) if latencies else None,
+        'upstream_calls': upstream,
+        'upstream_calls_per_view': round(calls / len(cities), 4),
+        # ru_maxrss is KiB on Linux; peak for the process so far
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def chart_costs(forecast, repeats=CHART_REPEATS):
+    """Median cost of each chart path for one forecast, split into the first
+    render of a forecast version (``build_ms``) and every rerun after it
+    (``rerun_ms``), which also pays what Streamlit does to the spec on each
+    call. ``payload_bytes`` is the JSON sent to the browser."""
+    import charts
+
+    def render_plotly(fig):
+        import plotly.io
+        import plotly.tools
+
+        # st.plotly_chart validates and serializes the figure on every call
+        fig = plotly.tools.return_figure_from_figure_or_data(fig, validate_figure=True)
+        return plotly.io.to_json(fig, validate=False)
+
+    def render_vega(spec):
+        # st.vega_lite_chart ships the spec as JSON
+        return json.dumps(spec)
+
+    paths = {'vega_24h': (charts.temperature_vega, 24, render_vega),
+             'vega_7d': (charts.temperature_vega, None, render_vega)}
+    if importlib.util.find_spec("plotly") is not None:
+        paths.update({'plotly_24h': (charts.temperature_figure, 24, render_plotly),
+                      'plotly_7d': (charts.temperature_figure, len(forecast.hourly['time']), render_plotly)})
+
+    def median_ms(run):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        return round(statistics.median(timings) * 1000, 3)
+
+    costs = {}
+    for name, (build, hours, render) in sorted(paths.items()):
+        def cold():
+            charts.clear_cache()
+            render(build(forecast, hours))
+
+        costs[name] = {
+            'build_ms': median_ms(cold),
+            'rerun_ms': median_ms(lambda: render(build(forecast, hours))),
+            'payload_bytes': len(render(build(forecast, hours))),
+        }
+    charts.clear_cache()
+    return costs
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    print(f"{'phase':<6}{'metric':<26}{'baseline':>12}{'current':>12}{'change':>10}")
+    for phase in PHASES:
+        for metric in COMPARED:
+            before = baseline['results'].get(phase, {}).get(metric)
+            after = current['results'].get(phase, {}).get(metric)
+            if before is None or after is None:
+                continue
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "-"
+            print(f"{phase:<6}{metric:<26}{before:>12}{after:>12}{change:>10}")
+    print(f"{'chart':<12}{'metric':<20}{'baseline':>12}{'current':>12}{'change':>10}")
+    for chart, costs in current['results'].get('charts', {}).items():
+        for metric in CHART_COMPARED:
+            before = baseline['results'].get('charts', {}).get(chart, {}).get(metric)
+            after = costs.get(metric)
+            if before is None or after is None:
+                continue
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "-"
+            print(f"{chart:<12}{metric:<20}{before:>12}{after:>12}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WeatherWise page-view benchmark")
+    parser.add_argument("--views", type=int, default=1000, help="page views per phase")
+    parser.add_argument("--concurrency", type=int, default=16, help="simultaneous sessions")
+    parser.add_argument("--cities", type=int, default=48, help="distinct cities in the mix")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of city popularity")
+    parser.add_argument("--latency", type=float, default=0.08, help="mock upstream latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.03, help="mock latency jitter, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock requests that fail")
+    parser.add_argument("--cache-url", default="memory://", help="WEATHERWISE_CACHE_URL for the run; use a fresh file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON results here as well as to stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="print the change against an earlier results file")
+    args = parser.parse_args()
+
+    mock, base_url = start_mock(args)
+    try:
+        # The fetch layer reads these at import time
+        os.environ['WEATHERWISE_GEOCODING_URL'] = base_url + "/v1/search"
+        os.environ['WEATHERWISE_FORECAST_URL'] = base_url + "/v1/forecast"
+        os.environ['WEATHERWISE_AIR_QUALITY_URL'] = base_url + "/v1/air-quality"
+        os.environ['WEATHERWISE_CACHE_URL'] = args.cache_url
+        for name, value in ISOLATED_ENV.items():
+            os.environ.setdefault(name, value)
+        sys.path.insert(0, ROOT)
+        import weather_cache
+        import weather_core
+
+        names, weights = popular_cities(args.cities, args.skew)
+        rng = random.Random(args.seed)
+        results = {}
+        for phase in PHASES:
+            results[phase] = run_phase(base_url, rng.choices(names, weights, k=args.views), args.concurrency)
+        results['cache'] = weather_cache.get_cache().stats()
+        location = weather_core.get_lat_lon(names[0])
+        results['charts'] = chart_costs(weather_core.get_weather_data(location['latitude'], location['longitude']))
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'python': platform.python_version(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Measure WeatherWise cold-start cost: module imports and the first render.
+
+Every sample runs in a fresh interpreter, so nothing is warm in
+``sys.modules``. The first render goes through Streamlit's AppTest, which
+executes weather_app.py the same way a new session on a freshly scaled-up
+container does.
+
+    python benchmarks/startup_benchmark.py --runs 5
+
+The signed-in view fetches a forecast; point WEATHERWISE_FORECAST_URL and
+friends at a local stub (and WEATHERWISE_CACHE_URL at a scratch file) to keep
+upstream latency out of the numbers, or pass --skip-main. The archive and
+the prefetcher are off and the rate limiter is in memory in every sample
+(ISOLATED_ENV), unless those variables are already set.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("pandas", "plotly", "numpy", "requests")
+
+# No archive writes, prefetch thread or shared limiter state from the samples
+ISOLATED_ENV = {
+    'WEATHERWISE_ARCHIVE': "0",
+    'WEATHERWISE_PREFETCH': "0",
+    'WEATHERWISE_RATE_LIMIT_DB': "memory",
+}
+
+IMPORT_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - start}}))
+"""
+
+RENDER_SNIPPET = """
+import json, logging, sys, time
+logging.disable(logging.WARNING)
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file({script!r}, default_timeout=60)
+if {authenticated!r}:
+    at.session_state['authenticated'] = True
+    at.session_state['user_name'] = "Benchmark"
+at.run()
+rendered = time.perf_counter()
+at.run()
+rerun = time.perf_counter()
+print(json.dumps({{
+    'streamlit_import': imported - start,
+    'first_render': rendered - imported,
+    'rerun': rerun - rendered,
+    'exception': [str(e.value) for e in at.exception],
+    'loaded': [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_snippet(code):
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True,
+        env={**ISOLATED_ENV, **os.environ},
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median(samples, field):
+    return statistics.median(sample[field] for sample in samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per measurement")
+    parser.add_argument("--skip-main", action="store_true", help="only render the sign-in screen")
+    args = parser.parse_args()
+
+    print(f"{'cold import':<28}{'median ms':>10}")
+    for module in ("streamlit", "weather_core", "pandas", "plotly.graph_objects"):
+        samples = [run_snippet(IMPORT_SNIPPET.format(module=module)) for _ in range(args.runs)]
+        print(f"{module:<28}{median(samples, 'seconds') * 1000:>10.1f}")
+
+    views = [("sign-in screen", False)]
+    if not args.skip_main:
+        views.append(("signed-in view", True))
+    script = os.path.join(ROOT, "weather_app.py")
+    print()
+    print(f"{'first render':<28}{'streamlit':>10}{'render':>10}{'rerun':>10}  heavy modules loaded")
+    for label, authenticated in views:
+        samples = [
+            run_snippet(RENDER_SNIPPET.format(script=script, authenticated=authenticated, heavy=HEAVY_MODULES))
+            for _ in range(args.runs)
+        ]
+        errors = [error for sample in samples for error in sample['exception']]
+        if errors:
+            print(f"{label}: app raised {errors[0]}", file=sys.stderr)
+        print(
+            f"{label:<28}"
+            f"{median(samples, 'streamlit_import') * 1000:>10.1f}"
+            f"{median(samples, 'first_render') * 1000:>10.1f}"
+            f"{median(samples, 'rerun') * 1000:>10.1f}"
+            f"  {', '.join(samples[-1]['loaded']) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Chart specs for the forecast views, built once per forecast version.
+
+Building a Plotly figure costs several milliseconds, and a rerun with the
+same forecast used to build it again. Figures and Vega-Lite specs are now
+cached process-wide, keyed by the forecast's version (place plus the frozen
+current block), so every session viewing the same city at the same update
+shares one. All Plotly charts start from the same LAYOUT.
+
+The 7-day hourly view (168 points) goes through Vega-Lite, which Streamlit
+renders natively from a plain JSON spec, with the series downsampled to
+MAX_POINTS by largest-triangle-three-buckets so peaks and troughs survive.
+
+Plotly and NumPy are imported on first use, like elsewhere in the app.
+"""
+import threading
+from collections import OrderedDict
+
+# Cached specs; a few per city in use
+CACHE_SIZE = 256
+# Points sent to the browser for the long view
+MAX_POINTS = 72
+
+LINE_COLOR = '#60a5fa'
+FILL_COLOR = 'rgba(96, 165, 250, 0.2)'
+GRID_COLOR = 'rgba(75, 85, 99, 0.3)'
+
+LAYOUT = {
+    'plot_bgcolor': 'rgba(31, 41, 55, 0.3)',
+    'paper_bgcolor': 'rgba(0,0,0,0)',
+    'font': {'color': 'white'},
+    'xaxis': {'showgrid': True, 'gridcolor': GRID_COLOR},
+    'yaxis': {'showgrid': True, 'gridcolor': GRID_COLOR},
+}
+
+_specs = OrderedDict()
+_specs_lock = threading.Lock()
+
+
+def forecast_version(forecast):
+    """What identifies one upstream update of a forecast."""
+    return forecast.latitude, forecast.longitude, forecast.current
+
+
+def _cached(key, build):
+    with _specs_lock:
+        spec = _specs.get(key)
+        if spec is not None:
+            _specs.move_to_end(key)
+            return spec
+    # Built outside the lock; two sessions racing just build it twice
+    spec = build()
+    with _specs_lock:
+        _specs[key] = spec
+        while len(_specs) > CACHE_SIZE:
+            _specs.popitem(last=False)
+    return spec
+
+
+def clear_cache():
+    with _specs_lock:
+        _specs.clear()
+
+
+def layout(**overrides):
+    """LAYOUT plus per-chart settings, as a Plotly layout dict.
+
+    Applied as explicit layout properties rather than a Plotly template:
+    st.plotly_chart's Streamlit theme fills ``layout.template`` in the
+    browser, and explicit properties are what win over it.
+    """
+    merged = {**LAYOUT, **overrides}
+    for axis in ('xaxis', 'yaxis'):
+        if axis in overrides:
+            merged[axis] = {**LAYOUT[axis], **overrides[axis]}
+    return merged
+
+
+def temperature_figure(forecast, hours=24):
+    """Plotly area chart of the next ``hours`` hourly temperatures.
+
+    The figure is shared between sessions; treat it as read-only.
+    """
+    def build():
+        import plotly.graph_objects as go
+
+        return go.Figure(
+            data=[go.Scatter(
+                x=forecast.local_times(forecast.hourly['time'][:hours]),
+                y=forecast.hourly['temperature_2m'][:hours],
+                mode='lines',
+                fill='tozeroy',
+                line={'color': LINE_COLOR, 'width': 3},
+                fillcolor=FILL_COLOR,
+            )],
+            layout=layout(
+                title=f"{hours}-Hour Temperature Forecast",
+                xaxis={'title': "Time"},
+                yaxis={'title': "Temperature (°C)"},
+                height=300,
+            ),
+        )
+
+    return _cached(('temperature_figure', forecast_version(forecast), hours), build)
+
+
+def daily_aqi_figure(days, means, title):
+    """Plotly bar chart of daily mean AQI, in the shared layout."""
+    import plotly.graph_objects as go
+
+    return go.Figure(
+        data=[go.Bar(x=days, y=means, marker_color='#a78bfa')],
+        layout=layout(title=title, yaxis={'title': "European AQI"}, height=250, xaxis={'showgrid': False}),
+    )
+
+
+def temperature_vega(forecast, hours=None, max_points=MAX_POINTS):
+    """Vega-Lite spec of the hourly temperatures (all of them by default),
+    downsampled to at most ``max_points``."""
+    def build():
+        times = forecast.hourly['time'][:hours]
+        x, y = downsample(times, forecast.hourly['temperature_2m'][:hours], max_points)
+        span = f"{len(times)}-Hour" if len(times) <= 48 else f"{round(len(times) / 24)}-Day"
+        # Wall-clock times without an offset; the browser shows them as given
+        labels = [str(t) for t in forecast.local_times(x).astype('datetime64[m]')]
+        return {
+            'title': f"{span} Temperature Forecast",
+            'height': 300,
+            'data': {'values': [
+                {'time': label, 'temperature': round(float(value), 1)} for label, value in zip(labels, y)
+            ]},
+            'mark': {'type': 'area', 'color': FILL_COLOR, 'line': {'color': LINE_COLOR, 'strokeWidth': 3}},
+            'encoding': {
+                'x': {'field': 'time', 'type': 'temporal', 'title': "Time"},
+                'y': {'field': 'temperature', 'type': 'quantitative', 'title': "Temperature (°C)"},
+            },
+        }
+
+    return _cached(('temperature_vega', forecast_version(forecast), hours, max_points), build)
+
+
+def downsample(x, y, max_points):
+    """Largest-triangle-three-buckets: keep the first and last points and,
+    from each bucket in between, the point spanning the largest triangle
+    with its neighbours' picks. NaNs are dropped first."""
+    import numpy as np
+
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    keep = ~np.isnan(y)
+    x, y = x[keep], y[keep]
+    if len(y) <= max_points or max_points < 3:
+        return x, y
+    xf = x.astype(float)
+    edges = np.linspace(1, len(y) - 1, max_points - 1).astype(int)
+    picked = [0]
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Mean of the next bucket, or the last point after the final bucket
+        if i + 2 < len(edges):
+            next_x, next_y = xf[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = xf[-1], y[-1]
+        prev = picked[-1]
+        areas = np.abs(
+            (xf[prev] - next_x) * (y[start:end] - y[prev]) - (xf[prev] - xf[start:end]) * (next_y - y[prev])
+        )
+        picked.append(start + int(areas.argmax()))
+    picked.append(len(y) - 1)
+    return x[picked], y[picked]
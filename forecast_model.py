@@ -0,0 +1,177 @@
+"""Compact in-memory and cached form of an Open-Meteo forecast.
+
+The raw JSON keeps every hourly value as a Python float in a list and every
+timestamp as an ISO string the page re-parses on each rerun. ``Forecast``
+holds the current block in a slotted dataclass, the hourly and daily series
+as NumPy arrays (float32 values, int64 epoch-second times) and serializes to
+a small header plus the raw array buffers, so a cache hit decodes with
+``np.frombuffer`` instead of a JSON parse.
+
+float32 is exact enough here: Open-Meteo reports at most two decimals and
+the advisory thresholds are whole or half units. NumPy is imported on
+first use, like in advisory_engine, to keep it off the sign-in screen.
+"""
+import json
+import struct
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime, timedelta
+
+MAGIC = b"WWFC0001"
+# magic, header length
+PREFIX = struct.Struct("<8sI")
+ALIGN = 8
+
+EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass(slots=True, frozen=True)
+class Current:
+    """The ``current`` block. Supports ``current['temperature_2m']`` as well,
+    so code written against the JSON block keeps working."""
+    time: int
+    temperature_2m: float
+    relative_humidity_2m: float
+    apparent_temperature: float
+    is_day: int
+    precipitation: float
+    weather_code: int
+    wind_speed_10m: float
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+
+CURRENT_FIELDS = tuple(field.name for field in fields(Current))
+
+
+@dataclass(slots=True)
+class Forecast:
+    latitude: float
+    longitude: float
+    utc_offset_seconds: int
+    timezone: str
+    current: Current
+    # variable -> array; 'time' is int64 epoch seconds, the rest float32
+    hourly: dict
+    daily: dict
+    # Metres above sea level of the model grid point, when upstream says
+    elevation: float = None
+
+    @classmethod
+    def from_json(cls, data):
+        """Build from one decoded Open-Meteo forecast response."""
+        offset = data.get('utc_offset_seconds', 0)
+        current = data['current']
+        return cls(
+            latitude=data['latitude'],
+            longitude=data['longitude'],
+            utc_offset_seconds=offset,
+            timezone=data.get('timezone', "GMT"),
+            current=Current(**{
+                name: int(_epoch_seconds(current[name], offset)) if name == 'time' else current.get(name)
+                for name in CURRENT_FIELDS
+            }),
+            hourly=_series(data.get('hourly', {}), offset, times=('time',)),
+            daily=_series(data.get('daily', {}), offset, times=('time', 'sunrise', 'sunset')),
+            elevation=data.get('elevation'),
+        )
+
+    def local_times(self, epochs):
+        """Wall-clock times at the location, as a datetime64[s] array for charts."""
+        import numpy as np
+
+        return (np.asarray(epochs, dtype=np.int64) + self.utc_offset_seconds).astype('datetime64[s]')
+
+    def local_datetime(self, epoch):
+        """Wall-clock time at the location as a naive datetime."""
+        return EPOCH + timedelta(seconds=int(epoch) + self.utc_offset_seconds)
+
+    def current_json(self):
+        """The current block as plain JSON data, times in local ISO form like the upstream API."""
+        current = asdict(self.current)
+        current['time'] = self.local_datetime(current['time']).isoformat(timespec='minutes')
+        return current
+
+
+def _epoch_seconds(values, offset):
+    import numpy as np
+
+    # Open-Meteo sends local wall-clock times without an offset
+    return np.asarray(values, dtype='datetime64[s]').astype(np.int64) - offset
+
+
+def _series(block, offset, times):
+    import numpy as np
+
+    series = {}
+    for name, values in block.items():
+        if name in times:
+            series[name] = _epoch_seconds(values, offset)
+        else:
+            # None (missing value) becomes NaN
+            series[name] = np.asarray(values, dtype=np.float32)
+    return series
+
+
+def encode(forecast):
+    """Serialize to header JSON plus 8-byte aligned raw array buffers."""
+    import numpy as np
+
+    arrays = []
+    buffers = []
+    position = 0
+    for block in ('hourly', 'daily'):
+        for name, array in getattr(forecast, block).items():
+            data = np.ascontiguousarray(array).tobytes()
+            arrays.append([block, name, array.dtype.str, len(array), position])
+            buffers.append(data + b"\0" * (-len(data) % ALIGN))
+            position += len(buffers[-1])
+    header = json.dumps({
+        'latitude': forecast.latitude,
+        'longitude': forecast.longitude,
+        'utc_offset_seconds': forecast.utc_offset_seconds,
+        'timezone': forecast.timezone,
+        'elevation': forecast.elevation,
+        'current': asdict(forecast.current),
+        'arrays': arrays,
+    }, separators=(',', ':')).encode()
+    header += b" " * (-(PREFIX.size + len(header)) % ALIGN)
+    return b"".join([PREFIX.pack(MAGIC, len(header)), header, *buffers])
+
+
+def peek_elevation(payload):
+    """The ``elevation`` of an encoded forecast, parsing only its header."""
+    if payload[:len(MAGIC)] != MAGIC:
+        return json.loads(payload).get('elevation')
+    _, header_length = PREFIX.unpack_from(payload)
+    return json.loads(payload[PREFIX.size:PREFIX.size + header_length]).get('elevation')
+
+
+def decode(payload):
+    """Inverse of ``encode``; arrays are read-only views on ``payload``.
+
+    Entries cached as raw JSON by older versions are converted on the fly.
+    """
+    import numpy as np
+
+    if payload[:len(MAGIC)] != MAGIC:
+        return Forecast.from_json(json.loads(payload))
+    _, header_length = PREFIX.unpack_from(payload)
+    start = PREFIX.size + header_length
+    header = json.loads(payload[PREFIX.size:start])
+    blocks = {'hourly': {}, 'daily': {}}
+    for block, name, dtype, count, position in header['arrays']:
+        blocks[block][name] = np.frombuffer(payload, dtype=dtype, count=count, offset=start + position)
+    return Forecast(
+        latitude=header['latitude'],
+        longitude=header['longitude'],
+        utc_offset_seconds=header['utc_offset_seconds'],
+        timezone=header['timezone'],
+        current=Current(**header['current']),
+        hourly=blocks['hourly'],
+        daily=blocks['daily'],
+        elevation=header.get('elevation'),
+    )
@@ -0,0 +1,273 @@
+"""Offline geocoding index built from a GeoNames-style dump.
+
+The index is a single memory-mapped file holding a sorted array of
+normalized place names and aliases, so opening it costs a few milliseconds
+and a lookup is a binary search over the mapped pages. ``get_lat_lon`` only
+falls back to the remote geocoding API when the index has no match.
+
+Build it from a GeoNames export (e.g. cities15000.txt, optionally with
+countryInfo.txt for country names)::
+
+    python geocoder.py build cities15000.txt --countries countryInfo.txt -o data/geonames.idx
+"""
+import argparse
+import heapq
+import mmap
+import os
+import re
+import struct
+import threading
+import unicodedata
+
+DEFAULT_INDEX_PATH = os.environ.get(
+    "WEATHERWISE_GEO_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "geonames.idx"),
+)
+
+MAGIC = b"WWGEO001"
+# magic, record count, key count, records offset, keys offset, strings offset
+HEADER = struct.Struct("<8sIIQQQ")
+# latitude, longitude, population, elevation, details offset, details length
+RECORD = struct.Struct("<ffIhxxII")
+# key offset, key length, record index
+KEY = struct.Struct("<III")
+# Stored elevation of places GeoNames has none for
+NO_ELEVATION = -32768
+# GeoNames' DEM value for no data (e.g. over water)
+DEM_NO_DATA = -9999
+FIELD_SEP = "\x1f"
+DETAIL_FIELDS = ('name', 'country_code', 'country', 'timezone')
+
+_non_word = re.compile(r"[^\w]+")
+
+
+def normalize(name):
+    """Case-fold a place name and strip accents and punctuation.
+
+    "Bengaluru ", "BENGALURU" and "bengaluru" all map to the same key.
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    return " ".join(_non_word.sub(" ", name.casefold()).split())
+
+
+class GeoIndex:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n_records, self.n_keys, self._records, self._keys, self._strings = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a WeatherWise geocoding index")
+
+    def _key_at(self, i):
+        offset, length, record = KEY.unpack_from(self._mm, self._keys + i * KEY.size)
+        start = self._strings + offset
+        return self._mm[start:start + length], record
+
+    def _lower_bound(self, key):
+        lo, hi = 0, self.n_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def record(self, i):
+        lat, lon, population, elevation, offset, length = RECORD.unpack_from(self._mm, self._records + i * RECORD.size)
+        start = self._strings + offset
+        details = dict(zip(DETAIL_FIELDS, self._mm[start:start + length].decode().split(FIELD_SEP)))
+        return {
+            **details,
+            'latitude': round(lat, 5),
+            'longitude': round(lon, 5),
+            'elevation': None if elevation == NO_ELEVATION else float(elevation),
+            'population': population,
+        }
+
+    def _population(self, i):
+        return RECORD.unpack_from(self._mm, self._records + i * RECORD.size)[2]
+
+    def lookup(self, name):
+        """Return the most populous place whose name or alias matches exactly."""
+        key = normalize(name).encode()
+        if not key:
+            return None
+        i = self._lower_bound(key)
+        if i < self.n_keys:
+            found, record = self._key_at(i)
+            # Keys with the same text are stored most populous first
+            if found == key:
+                return self.record(record)
+        return None
+
+    def suggest(self, prefix, limit=5, scan_limit=2000):
+        """Return up to ``limit`` places whose name or alias starts with ``prefix``."""
+        key = normalize(prefix).encode()
+        if not key:
+            return []
+        seen = set()
+        i = self._lower_bound(key)
+        end = min(self.n_keys, i + scan_limit)
+        while i < end:
+            found, record = self._key_at(i)
+            if not found.startswith(key):
+                break
+            seen.add(record)
+            i += 1
+        # Rank on the fixed-size population field; only decode the winners
+        top = heapq.nlargest(limit, seen, key=self._population)
+        return [self.record(r) for r in top]
+
+
+_index = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_index(path=DEFAULT_INDEX_PATH):
+    """Return the shared index, or None when no index file has been built."""
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            if not _index_loaded:
+                _index = GeoIndex(path) if os.path.exists(path) else None
+                _index_loaded = True
+    return _index
+
+
+def lookup(name):
+    index = get_index()
+    return index.lookup(name) if index is not None else None
+
+
+def suggest(prefix, limit=5):
+    index = get_index()
+    return index.suggest(prefix, limit) if index is not None else []
+
+
+# Index building
+
+def read_country_names(path):
+    names = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) > 4:
+                names[cols[0]] = cols[4]
+    return names
+
+
+def read_geonames(path, country_names=None):
+    """Yield (names, record fields) from a GeoNames main-table dump."""
+    country_names = country_names or {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 18:
+                continue
+            name, ascii_name, alternates = cols[1], cols[2], cols[3]
+            names = {name, ascii_name}
+            names.update(a for a in alternates.split(",") if a)
+            elevation = _elevation(cols[15])
+            if elevation is None:
+                elevation = _elevation(cols[16])
+            yield names, {
+                'name': name,
+                'latitude': float(cols[4]),
+                'longitude': float(cols[5]),
+                'country_code': cols[8],
+                'country': country_names.get(cols[8], cols[8]),
+                'timezone': cols[17],
+                'population': int(cols[14] or 0),
+                'elevation': elevation,
+            }
+
+
+def _elevation(value):
+    """Metres from a GeoNames elevation or DEM column, None when unknown."""
+    if not value:
+        return None
+    elevation = int(float(value))
+    if elevation == DEM_NO_DATA:
+        return None
+    return max(NO_ELEVATION + 1, min(32767, elevation))
+
+
+def build_index(places, path):
+    """Write an index file from an iterable of (names, record fields)."""
+    strings = bytearray()
+    string_offsets = {}
+
+    def intern(data):
+        offset = string_offsets.get(data)
+        if offset is None:
+            offset = string_offsets[data] = len(strings)
+            strings.extend(data)
+        return offset
+
+    records = bytearray()
+    populations = []
+    keys = []
+    for names, place in places:
+        details = FIELD_SEP.join(str(place[field]) for field in DETAIL_FIELDS).encode()
+        record = len(populations)
+        records.extend(RECORD.pack(
+            place['latitude'], place['longitude'], place['population'],
+            NO_ELEVATION if place['elevation'] is None else place['elevation'], intern(details), len(details),
+        ))
+        populations.append(place['population'])
+        for key in {normalize(n).encode() for n in names}:
+            if key:
+                keys.append((key, record))
+
+    keys.sort(key=lambda k: (k[0], -populations[k[1]]))
+    key_table = bytearray()
+    for key, record in keys:
+        key_table.extend(KEY.pack(intern(key), len(key), record))
+
+    records_offset = HEADER.size
+    keys_offset = records_offset + len(records)
+    strings_offset = keys_offset + len(key_table)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(populations), len(keys), records_offset, keys_offset, strings_offset))
+        f.write(records)
+        f.write(key_table)
+        f.write(strings)
+    os.replace(tmp_path, path)
+    return len(populations), len(keys)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WeatherWise offline geocoding index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="build an index from a GeoNames dump")
+    build.add_argument("dump", help="GeoNames main-table file, e.g. cities15000.txt")
+    build.add_argument("--countries", help="GeoNames countryInfo.txt for country names")
+    build.add_argument("-o", "--output", default=DEFAULT_INDEX_PATH)
+    query = sub.add_parser("query", help="look up a name or prefix")
+    query.add_argument("name")
+    query.add_argument("--prefix", action="store_true")
+    query.add_argument("-i", "--index", default=DEFAULT_INDEX_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        countries = read_country_names(args.countries) if args.countries else None
+        n_records, n_keys = build_index(read_geonames(args.dump, countries), args.output)
+        print(f"Wrote {n_records} places and {n_keys} names to {args.output}")
+    else:
+        index = GeoIndex(args.index)
+        results = index.suggest(args.name) if args.prefix else [index.lookup(args.name)]
+        for place in results:
+            print(place)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""In-process metrics for the WeatherWise hot path, exported as Prometheus text.
+
+Counters and fixed-bucket histograms only: an observation is a bisect and a
+couple of additions under a lock, cheap enough to leave on in production.
+Each process keeps its own numbers; scrape every worker. api_server serves
+them on its /metrics route. Other processes, such as the Streamlit page,
+call ``serve()``, which starts a small /metrics listener on its own port.
+The page does that when ``WEATHERWISE_METRICS_PORT`` is set; give each
+worker process its own port.
+
+    with metrics.timer('forecast'):
+        ...
+
+    @metrics.timed('advisory')
+    def generate_smart_advisory(...):
+        ...
+"""
+import bisect
+import functools
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans a hot cache read up to a slow upstream call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Bytes; a single-point forecast is a few KB, a 100-point batch a few hundred
+SIZE_BUCKETS = (1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name + _labels(self.labelnames, key), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+    def quantile(self, q, **labels):
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        key = tuple(labels[name] for name in self.labelnames)
+        series = self.snapshot().get(key)
+        if series is None or not series[2]:
+            return None
+        counts, _, count = series
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            if cumulative >= q * count:
+                return bound
+        return math.inf
+
+    def samples(self):
+        for key, (counts, total, count) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield self.name + "_bucket" + _labels(self.labelnames, key, [('le', _format(bound))]), cumulative
+            yield self.name + "_sum" + _labels(self.labelnames, key), total
+            yield self.name + "_count" + _labels(self.labelnames, key), count
+
+
+def counter(name, help, labelnames=()):
+    metric = Counter(name, help, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+    metric = Histogram(name, help, labelnames, buckets)
+    _registry.append(metric)
+    return metric
+
+
+STAGE_SECONDS = histogram(
+    "weatherwise_stage_seconds", "Time spent per hot-path stage.", ['stage'])
+STAGE_ERRORS = counter(
+    "weatherwise_stage_errors_total", "Stages that ended in an exception.", ['stage'])
+CACHE_KEYS = counter(
+    "weatherwise_cache_keys_total",
+    "Cache lookups by outcome: hit, stale, miss, fetched, coalesced, coalesced_remote.",
+    ['namespace', 'result'])
+UPSTREAM_SECONDS = histogram(
+    "weatherwise_upstream_seconds", "Upstream HTTP request latency.", ['endpoint'])
+UPSTREAM_RESPONSES = counter(
+    "weatherwise_upstream_responses_total",
+    "Upstream HTTP responses by status code; 'error' when no response arrived.",
+    ['endpoint', 'status'])
+UPSTREAM_BYTES = histogram(
+    "weatherwise_upstream_response_bytes", "Upstream response body size.", ['endpoint'], SIZE_BUCKETS)
+
+
+class timer:
+    """Context manager that records its block under ``stage``."""
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, stage=self.stage)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(stage=self.stage)
+        return False
+
+
+def timed(stage):
+    """Decorator form of ``timer``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Stopwatch:
+    """Times consecutive sections of straight-line code, like a script's layout.
+
+    Each ``lap(stage)`` records the time since the previous lap (or creation).
+    """
+    __slots__ = ('last',)
+
+    def __init__(self):
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        STAGE_SECONDS.observe(now - self.last, stage=stage)
+        self.last = now
+
+
+def stage_summary():
+    """Per-stage count, mean and approximate p50/p95 in milliseconds, for the debug panel."""
+    summary = {}
+    for (stage,), (_, total, count) in sorted(STAGE_SECONDS.snapshot().items()):
+        summary[stage] = {
+            'count': count,
+            'mean_ms': round(total / count * 1000, 2),
+            'p50_ms': STAGE_SECONDS.quantile(0.5, stage=stage) * 1000,
+            'p95_ms': STAGE_SECONDS.quantile(0.95, stage=stage) * 1000,
+        }
+    return summary
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name} {_format(value)}" for name, value in metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _metrics_handler():
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve(port, host="0.0.0.0"):
+    """Serve ``render()`` at /metrics on ``port`` from a daemon thread, once
+    per process; later calls are no-ops. Returns the bound (host, port), or
+    None when the port couldn't be bound (logged, never raised)."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            # http.server loads only in processes that expose a scrape port
+            from http.server import ThreadingHTTPServer
+
+            try:
+                _server = ThreadingHTTPServer((host, port), _metrics_handler())
+            except OSError as e:
+                logger.warning("Metrics listener not started on port %s: %s", port, e)
+                # Don't retry on every call, e.g. every Streamlit rerun
+                _server = False
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="weatherwise-metrics", daemon=True).start()
+        return _server.server_address if _server else None
@@ -0,0 +1,177 @@
+"""Background prefetcher that keeps popular locations warm in the cache.
+
+Page views record what they asked for; a daemon thread keeps a decaying
+popularity score per item and, shortly before a top-N item's cache entry
+expires, refreshes it so nobody waits on a cold fetch for a popular city.
+
+Refresh lead times are jittered per key so entries fetched together don't
+all come due in the same tick, due items are batched like page views are,
+and the upstream requests spent per minute are capped by a token bucket.
+Its fetches run at background priority in the shared rate limiter, so they
+only use upstream quota that page views leave over.
+Refreshes go through ``Cache.refresh``, so with a shared cache only one
+worker process refreshes a given key.
+
+Configured from the environment:
+
+* ``WEATHERWISE_PREFETCH=0`` disables it
+* ``WEATHERWISE_PREFETCH_TOP_N`` - items kept warm per kind (default 50)
+* ``WEATHERWISE_PREFETCH_BUDGET`` - upstream requests per minute (default 30)
+"""
+import heapq
+import logging
+import os
+import random
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+import metrics
+import ratelimit
+import weather_cache
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("WEATHERWISE_PREFETCH", "1") != "0"
+TOP_N = int(os.environ.get("WEATHERWISE_PREFETCH_TOP_N", "50"))
+BUDGET_PER_MINUTE = float(os.environ.get("WEATHERWISE_PREFETCH_BUDGET", "30"))
+
+# Popularity halves every hour without new page views
+HALF_LIFE = 3600
+# Refresh this long before expiry, scaled per key into [LEAD_TIME / 2, LEAD_TIME)
+LEAD_TIME = 300
+# Seconds between scheduler ticks, +/- TICK_JITTER
+TICK_INTERVAL = 30
+TICK_JITTER = 5
+# Scores below this are forgotten
+MIN_SCORE = 0.05
+
+PREFETCHED = metrics.counter(
+    "weatherwise_prefetch_keys_total", "Cache keys refreshed ahead of expiry by the prefetcher.", ['kind'])
+
+# key(item) -> cache key; fetch_many(items) -> values in order; batch_size
+# items share one upstream request; encode overrides the cache's JSON encoding
+Target = namedtuple('Target', ['key', 'fetch_many', 'ttl', 'batch_size', 'encode'], defaults=(None,))
+
+
+class Prefetcher:
+    def __init__(self, cache, targets, top_n=TOP_N, budget_per_minute=BUDGET_PER_MINUTE):
+        self.cache = cache
+        self.targets = targets
+        self.top_n = top_n
+        self.rate = budget_per_minute / 60
+        self._tokens = self.rate * TICK_INTERVAL
+        self._last_refill = time.monotonic()
+        # (kind, item) -> (score, last update)
+        self._scores = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def record(self, kind, item):
+        """Count one page view of ``item`` (a cell, a query) for ``kind``."""
+        now = time.monotonic()
+        with self._lock:
+            score, updated = self._scores.get((kind, item), (0.0, now))
+            self._scores[(kind, item)] = (_decay(score, now - updated) + 1, now)
+
+    def popular(self, kind):
+        """The top-N items of ``kind`` by decayed score, most popular first."""
+        now = time.monotonic()
+        with self._lock:
+            scored = [
+                (_decay(score, now - updated), item)
+                for (item_kind, item), (score, updated) in self._scores.items()
+                if item_kind == kind
+            ]
+        return [item for _, item in heapq.nlargest(self.top_n, scored, key=lambda pair: pair[0])]
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="weatherwise-prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(TICK_INTERVAL + random.uniform(-TICK_JITTER, TICK_JITTER)):
+            try:
+                self.tick()
+            except Exception as e:
+                logger.warning("Prefetch tick failed: %s", e)
+
+    def tick(self):
+        """Refresh whatever popular items are due, within the request budget."""
+        self._forget_cold()
+        self._refill()
+        for kind, target in self.targets.items():
+            due = self._due(target, self.popular(kind))
+            for start in range(0, len(due), target.batch_size):
+                if self._tokens < 1:
+                    return
+                self._tokens -= 1
+                self._refresh(kind, target, due[start:start + target.batch_size])
+
+    def _due(self, target, items):
+        # Soonest to expire first, so a tight budget goes where it matters
+        due = []
+        for item in items:
+            key = target.key(item)
+            remaining = self.cache.expires_in(key)
+            if remaining is None or remaining < _lead_time(key):
+                due.append((remaining if remaining is not None else float('-inf'), item))
+        due.sort(key=lambda pair: pair[0])
+        return [item for _, item in due]
+
+    def _refresh(self, kind, target, items):
+        item_for_key = {target.key(item): item for item in items}
+        codec = {'encode': target.encode} if target.encode else {}
+        with ratelimit.background():
+            refreshed = self.cache.refresh(
+                list(item_for_key), lambda keys: target.fetch_many([item_for_key[key] for key in keys]), target.ttl,
+                **codec,
+            )
+        PREFETCHED.inc(len(refreshed), kind=kind)
+
+    def _refill(self):
+        now = time.monotonic()
+        # Unused budget carries over for at most two ticks
+        self._tokens = min(self.rate * TICK_INTERVAL * 2, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _forget_cold(self):
+        now = time.monotonic()
+        with self._lock:
+            self._scores = {
+                entry: (score, updated) for entry, (score, updated) in self._scores.items()
+                if _decay(score, now - updated) >= MIN_SCORE
+            }
+
+
+def _decay(score, elapsed):
+    return score * 0.5 ** (elapsed / HALF_LIFE)
+
+
+def _lead_time(key):
+    # Stable per key, so one key's lead doesn't wander between ticks
+    return LEAD_TIME * (0.5 + (zlib.crc32(key.encode()) % 1000) / 2000)
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher(targets):
+    """Return the process-wide prefetcher, starting it on first use; None when disabled."""
+    global _prefetcher
+    if not ENABLED:
+        return None
+    if _prefetcher is None:
+        with _prefetcher_lock:
+            if _prefetcher is None:
+                prefetcher = Prefetcher(weather_cache.get_cache(), targets)
+                prefetcher.start()
+                _prefetcher = prefetcher
+    return _prefetcher
@@ -0,0 +1,245 @@
+"""Token-bucket rate limiting for the Open-Meteo endpoints, shared per box.
+
+Each endpoint (geocoding, forecast, air quality) has a bucket refilled at
+its quota's rate. Buckets live in a small SQLite file, so every thread and
+worker process on the machine draws from the same budget; updates happen
+inside ``BEGIN IMMEDIATE`` transactions.
+
+Priorities: interactive requests (a page view waiting on the answer) may
+drain a bucket; background ones (stale refreshes, the prefetcher, batch
+jobs) leave BACKGROUND_RESERVE of it untouched. Under load, user fetches
+therefore go first without any cross-process queue, and background work
+waits for quiet moments. Wrap background work in ``with background():``.
+
+A request takes as many tokens as upstream counts it as calls: Open-Meteo
+bills every location of a batched request, and a location asking for many
+variables as several calls, so a 100-point forecast batch costs far more
+than one token (see weather_client.call_weight). A request costing more than
+a bucket holds goes once the bucket is full and leaves it in debt, so the
+callers after it wait for the quota it used.
+
+Buckets are per upstream host and endpoint, so a benchmark pointed at a
+local mock never spends the real API's quota on the same machine.
+
+A 429 from upstream pauses its endpoint for everyone until its
+``Retry-After`` (default RETRY_AFTER_DEFAULT seconds) has passed.
+
+Configured from the environment:
+
+* ``WEATHERWISE_RATE_LIMIT`` - requests per minute per endpoint (default
+  480, under Open-Meteo's 600/min for the free tier); 0 disables limiting.
+  With several machines, give each its share.
+* ``WEATHERWISE_RATE_LIMIT_BURST`` - seconds of quota a bucket can save up
+  (default 5).
+* ``WEATHERWISE_RATE_LIMIT_DB`` - bucket file (default in the temp dir);
+  ``memory`` keeps buckets per process.
+"""
+import contextlib
+import contextvars
+import email.utils
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PER_MINUTE = float(os.environ.get("WEATHERWISE_RATE_LIMIT", "480"))
+DEFAULT_DB = os.environ.get(
+    "WEATHERWISE_RATE_LIMIT_DB", os.path.join(tempfile.gettempdir(), "weatherwise-ratelimit.sqlite3")
+)
+
+# Seconds of quota a bucket can save up; keep it within upstream's own window
+BURST_SECONDS = float(os.environ.get("WEATHERWISE_RATE_LIMIT_BURST", "5"))
+# Fraction of a bucket background requests may not take
+BACKGROUND_RESERVE = 0.5
+# Longest a request waits for a token before giving up
+MAX_WAIT = {'interactive': 2.0, 'background': 30.0}
+# Pause after a 429 without a usable Retry-After
+RETRY_AFTER_DEFAULT = 10
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+_priority = contextvars.ContextVar('weatherwise_priority', default=INTERACTIVE)
+
+WAIT_SECONDS = metrics.histogram(
+    "weatherwise_ratelimit_wait_seconds", "Time requests waited for an upstream token.", ['endpoint', 'priority'])
+REJECTED = metrics.counter(
+    "weatherwise_ratelimit_rejected_total", "Requests given up after waiting too long for a token.",
+    ['endpoint', 'priority'])
+
+
+class RateLimitedError(Exception):
+    """Raised when no token became available within the caller's wait limit."""
+
+
+@contextlib.contextmanager
+def background():
+    """Run the enclosed fetches at background priority."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def parse_retry_after(value, default=RETRY_AFTER_DEFAULT):
+    """Seconds from a Retry-After header: delta-seconds or an HTTP date."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+# Stores keep (tokens, updated, paused_until) per bucket. take() refills,
+# then takes ``cost`` tokens if at least ``floor + cost`` (at most a full
+# bucket) are there; it returns 0 on success or the seconds to wait before
+# trying again.
+
+class MemoryBucketStore:
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, name, rate, capacity, floor, cost=1):
+        with self._lock:
+            state = self._buckets.get(name, (capacity, time.time(), 0.0))
+            state, wait = _take(state, rate, capacity, floor, cost)
+            self._buckets[name] = state
+            return wait
+
+    def pause(self, name, until):
+        with self._lock:
+            tokens, updated, paused_until = self._buckets.get(name, (0.0, time.time(), 0.0))
+            self._buckets[name] = (tokens, updated, max(paused_until, until))
+
+
+class SQLiteBucketStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, paused_until REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode, so the explicit BEGIN IMMEDIATE below takes the write lock
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def _update(self, name, change):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated, paused_until FROM buckets WHERE name = ?", (name,)).fetchone()
+            state, result = change(row)
+            conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)", (name, *state))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def take(self, name, rate, capacity, floor, cost=1):
+        return self._update(name, lambda row: _take(row or (capacity, time.time(), 0.0), rate, capacity, floor, cost))
+
+    def pause(self, name, until):
+        def change(row):
+            tokens, updated, paused_until = row or (0.0, time.time(), 0.0)
+            return (tokens, updated, max(paused_until, until)), None
+
+        self._update(name, change)
+
+
+def _take(state, rate, capacity, floor, cost=1):
+    tokens, updated, paused_until = state
+    now = time.time()
+    tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    if paused_until > now:
+        return (tokens, now, paused_until), paused_until - now
+    # A cost beyond what the bucket can hold goes on a full bucket, into debt
+    needed = min(floor + cost, capacity)
+    if tokens >= needed:
+        return (tokens - cost, now, paused_until), 0.0
+    return (tokens, now, paused_until), (needed - tokens) / rate
+
+
+def bucket_name(endpoint, host=None):
+    return f"{host}/{endpoint}" if host else endpoint
+
+
+class RateLimiter:
+    def __init__(self, store, per_minute=PER_MINUTE, burst_seconds=BURST_SECONDS):
+        self.store = store
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+
+    def acquire(self, endpoint, priority=None, cost=1, host=None):
+        """Block until a request to ``endpoint`` (on ``host``) costing ``cost``
+        calls may go; raises RateLimitedError when that would take longer
+        than the priority's MAX_WAIT."""
+        priority = priority or current_priority()
+        floor = self.capacity * BACKGROUND_RESERVE if priority == BACKGROUND else 0.0
+        start = time.monotonic()
+        deadline = start + MAX_WAIT[priority]
+        while True:
+            try:
+                wait = self.store.take(bucket_name(endpoint, host), self.rate, self.capacity, floor, cost)
+            except sqlite3.Error as e:
+                # Like the cache, a broken limiter must not block fetches
+                logger.warning("Rate limiter unavailable for %s: %s", endpoint, e)
+                return
+            if wait <= 0:
+                WAIT_SECONDS.observe(time.monotonic() - start, endpoint=endpoint, priority=priority)
+                return
+            if time.monotonic() + wait > deadline:
+                REJECTED.inc(endpoint=endpoint, priority=priority)
+                raise RateLimitedError(f"{endpoint} request quota exhausted, next slot in {wait:.1f}s")
+            time.sleep(wait)
+
+    def pause(self, endpoint, seconds, host=None):
+        """Hold every caller of ``endpoint`` (on ``host``) off for ``seconds`` (after a 429)."""
+        logger.warning("Upstream throttled %s; pausing it for %.1fs", endpoint, seconds)
+        try:
+            self.store.pause(bucket_name(endpoint, host), time.time() + seconds)
+        except sqlite3.Error as e:
+            logger.warning("Rate limiter unavailable for %s: %s", endpoint, e)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Return the process-wide limiter, or None when limiting is disabled."""
+    global _limiter
+    if PER_MINUTE <= 0:
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                store = MemoryBucketStore() if DEFAULT_DB == "memory" else SQLiteBucketStore(DEFAULT_DB)
+                _limiter = RateLimiter(store)
+    return _limiter
@@ -0,0 +1,180 @@
+"""generate_smart_advisory as it was before advisory_engine, kept verbatim
+as the reference for the parity tests."""
+
+
+def generate_smart_advisory(current, daily, aqi):
+    temp = current['temperature_2m']
+    feels_like = current['apparent_temperature']
+    humidity = current['relative_humidity_2m']
+    wind = current['wind_speed_10m']
+    rain = current['precipitation']
+    is_day = current['is_day']
+    uv_index = daily['uv_index_max'][0]
+    weather_code = current['weather_code']
+
+    outfit = []
+    hygiene = []
+    lifestyle = []
+    routine = []
+
+    # WARDROBE LOGIC
+    if feels_like < 5:
+        outfit.append("❄️ Base: Thermal innerwear + Woolen sweater + Heavy Coat.")
+    elif feels_like < 12:
+        outfit.append("🧥 Base: Puffer jacket or Heavy trench coat.")
+    elif feels_like < 18:
+        outfit.append("🧣 Base: Hoodie, Cardigan, or Denim jacket.")
+    elif feels_like < 25:
+        outfit.append("👕 Base: Long-sleeve t-shirt or Flannels.")
+    elif feels_like < 30:
+        outfit.append("👚 Base: Breathable cotton or linen. Short sleeves.")
+    else:
+        outfit.append("🎽 Base: Loose-fit synthetics. Shorts/Skirts permitted.")
+
+    # Footwear
+    if rain > 0.5:
+        outfit.append("👢 Shoes: Waterproof boots or gumboots. Avoid suede.")
+    elif rain > 0:
+        outfit.append("👟 Shoes: Water-resistant leather sneakers. No canvas..")
+    elif temp > 30:
+        outfit.append("👡 Shoes: Open-toe sandals or breathable mesh trainers.")
+    elif feels_like < 10:
+        outfit.append("🧦 Shoes: Insulated boots with thick wool socks.")
+    else:
+        outfit.append("👞 Shoes: Comfortable loafers or casual sneakers.")
+
+    # Fabrics & Colors
+    if temp > 28 and is_day:
+        outfit.append("🎨 Style: Wear light colors (white/beige) to reflect heat.")
+        outfit.append("🧵 Fabric: Opt for 100% Linen or Cotton.")
+    elif feels_like < 15:
+        outfit.append("🎨 Style: Dark colors absorb heat better today.")
+        outfit.append("🧵 Fabric: Fleece, Wool, or Cashmere blends.")
+    else:
+        outfit.append("🎨 Style: Any color works today.")
+        outfit.append("🧵 Fabric: Comfortable cotton blends or light layers.")
+
+    # Accessories
+    accessories_added = False
+    if rain > 0.0:
+        if wind > 20:
+            outfit.append("🚫 Warning: Wind is too strong for umbrellas! Use a raincoat.")
+        else:
+            outfit.append("☂️ Gear: Carry a sturdy umbrella.")
+        accessories_added = True
+    if uv_index > 5 and is_day:
+        outfit.append("🕶️ Extras: Polarized sunglasses & wide-brim hat required.")
+        accessories_added = True
+    if not accessories_added:
+        outfit.append("🎒 Extras: A standard backpack or handbag is sufficient.")
+
+    # SELF CARE
+    if humidity < 35:
+        hygiene.append("🧴 Skin: Dry air alert. Use oil-based moisturizer & lip balm.")
+    elif humidity > 75:
+        hygiene.append("🧼 Skin: High humidity. Use gel-based moisturizer. Carry blotting paper.")
+    else:
+        hygiene.append("✨ Skin: Balanced humidity. Standard lotion is fine.")
+
+    # Sun Protection
+    if uv_index >= 8 and is_day:
+        hygiene.append("🛡️ SPF: Extreme UV. Apply SPF 50+ every 2 hours.")
+    elif uv_index >= 5 and is_day:
+        hygiene.append("🛡️ SPF: High UV. Apply SPF 30+ before stepping out.")
+    elif is_day:
+        hygiene.append("🛡️ SPF: Low UV. Daily SPF 15 moisturizer is sufficient.")
+    else:
+        hygiene.append("🌙 Care: No UV concern. Focus on night-time skincare routine.")
+
+    # Hair & Eyes
+    dew_point = temp - ((100 - humidity) / 5)
+    hair_eye_added = False
+    if dew_point > 20:
+        hygiene.append("🦁 Hair: Severe Frizz Alert! Use anti-humidity serum.")
+        hair_eye_added = True
+    if wind > 20 and is_day:
+        hygiene.append("👁️ Eyes: Windy & bright. Wear sunglasses to prevent dry eyes.")
+        hair_eye_added = True
+    if not hair_eye_added:
+        hygiene.append("👀 Eyes & Hair: Conditions are mild. Standard care applies.")
+
+    # Hydration
+    if temp > 30:
+        hygiene.append("🥤 Hydration: Add electrolytes to your water today.")
+    elif temp < 15:
+        hygiene.append("🍵 Hydration: Warm herbal teas will keep you hydrated.")
+    else:
+        hygiene.append("💧 Hydration: Maintain distinct daily water intake (approx 2.5L).")
+
+    # LIFESTYLE
+    if aqi < 50 and rain == 0:
+        lifestyle.append("🏃 Exercise: Perfect conditions for an outdoor run.")
+    elif rain > 0:
+        lifestyle.append("🧘 Exercise: Rainy day. Try Yoga or Calisthenics indoors.")
+    elif aqi >= 100:
+        lifestyle.append("😷 Health: Air is poor. Gym workout only. Wear mask outdoors.")
+    else:
+        lifestyle.append("💪 Exercise: Weather is neutral. Good for a gym session or light jog.")
+
+    # Food & Diet
+    if temp > 32:
+        lifestyle.append("🥗 Diet: Eat cooling foods like cucumber, melons, and salads.")
+    elif temp < 15:
+        lifestyle.append("🍲 Diet: Hearty soups and root vegetables recommended.")
+    else:
+        lifestyle.append("🍎 Diet: Balanced weather. Great time for fresh fruits and veggies.")
+
+    # Productivity & Mood
+    if rain > 0 or weather_code > 50:
+        lifestyle.append("🎧 Focus: Gloomy weather is perfect for deep work. Use lo-fi beats.")
+    elif is_day and 20 < temp < 30:
+        lifestyle.append("💡 Focus: Great weather! Take walking meetings if possible.")
+    else:
+        lifestyle.append("✨ Mood: Steady weather. Good for clearing your backlog.")
+
+    # Home Environment
+    if humidity > 70:
+        lifestyle.append("🏠 Home: Run a dehumidifier or AC dry mode to prevent mold.")
+    elif humidity < 30:
+        lifestyle.append("🏠 Home: Air is dry. Use a humidifier for better sleep.")
+    else:
+        lifestyle.append("🏠 Home: Indoor climate is comfortable. Open windows for fresh air.")
+
+    # DAILY ROUTINE
+    if rain > 0:
+        routine.append("07:00 AM - 🧘 Indoor Yoga (Rainy Start)")
+    elif aqi < 50:
+        routine.append("07:00 AM - 🏃 Morning Run (Clean Air)")
+    else:
+        routine.append("07:00 AM - 🏋️ Gym Workout / Stretching")
+
+    if rain > 0.5:
+        routine.append("08:30 AM - 🚗 Leave 20m early (Traffic)")
+    else:
+        routine.append("08:45 AM - 🚇 Regular Commute")
+
+    if temp > 30:
+        routine.append("01:00 PM - 🥗 Light Salad Lunch (Heat)")
+    elif temp < 15:
+        routine.append("01:00 PM - 🍜 Hot Soup & Sandwich")
+    else:
+        routine.append("01:00 PM - 🍱 Balanced Healthy Lunch")
+
+    if temp > 28:
+        routine.append("03:00 PM - 🥤 Hydration Break (Iced Tea)")
+    else:
+        routine.append("03:00 PM - ☕ Coffee/Tea Break")
+
+    if rain == 0 and 15 < temp < 27:
+        routine.append("06:30 PM - 🚶 Evening Walk / Park")
+    elif aqi > 100:
+        routine.append("06:30 PM - 🏠 Indoor Hobby (Bad Air)")
+    else:
+        routine.append("06:30 PM - 📖 Reading / Relaxation")
+
+    return {
+        'outfit': outfit,
+        'hygiene': hygiene,
+        'lifestyle': lifestyle,
+        'routine': routine
+    }
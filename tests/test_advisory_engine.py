@@ -0,0 +1,126 @@
+import itertools
+import math
+
+import pytest
+
+import advisory_engine
+from baseline_advisory import generate_smart_advisory
+
+# Values on and around every threshold the rules use; NaN AQI is what the
+# page passes when air quality is unavailable
+GRID = {
+    'temp': [14, 15, 21, 27, 28, 30, 32, 33],
+    'feels_like': [4, 5, 10, 12, 15, 18, 25, 30],
+    'humidity': [20, 30, 35, 70, 75, 90],
+    'wind': [20, 21],
+    'rain': [0, 0.5, 1],
+    'is_day': [0, 1],
+    'uv_index': [4, 5, 8],
+    'weather_code': [50, 51],
+    'aqi': [49, 50, 100, 101, math.nan],
+}
+
+
+def grid_rows():
+    return [dict(zip(GRID, values)) for values in itertools.product(*GRID.values())]
+
+
+def baseline(row):
+    current = {
+        'temperature_2m': row['temp'],
+        'apparent_temperature': row['feels_like'],
+        'relative_humidity_2m': row['humidity'],
+        'wind_speed_10m': row['wind'],
+        'precipitation': row['rain'],
+        'is_day': row['is_day'],
+        'weather_code': row['weather_code'],
+    }
+    return generate_smart_advisory(current, {'uv_index_max': [row['uv_index']]}, row['aqi'])
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return grid_rows()
+
+
+@pytest.fixture(scope='module')
+def expected(rows):
+    return [baseline(row) for row in rows]
+
+
+def test_grid_covers_the_columns():
+    assert set(GRID) == set(advisory_engine.COLUMNS)
+
+
+def test_evaluate_row_matches_baseline(rows, expected):
+    mismatches = [row for row, want in zip(rows, expected) if advisory_engine.evaluate_row(row) != want]
+    assert not mismatches, f"{len(mismatches)} rows differ, first: {mismatches[0]}"
+
+
+def test_evaluate_batch_matches_baseline(rows, expected):
+    np = pytest.importorskip("numpy")
+    columns = {name: np.array([row[name] for row in rows], dtype=float) for name in GRID}
+    got = advisory_engine.evaluate_batch(columns)
+    mismatches = [row for row, have, want in zip(rows, got, expected) if have != want]
+    assert not mismatches, f"{len(mismatches)} rows differ, first: {mismatches[0]}"
+
+
+def test_row_from_conditions_feeds_evaluate_row():
+    current = {
+        'temperature_2m': 31, 'apparent_temperature': 33, 'relative_humidity_2m': 80, 'wind_speed_10m': 5,
+        'precipitation': 0, 'is_day': 1, 'weather_code': 1,
+    }
+    daily = {'uv_index_max': [9]}
+    row = advisory_engine.row_from_conditions(current, daily, math.nan)
+    assert advisory_engine.evaluate_row(row) == generate_smart_advisory(current, daily, math.nan)
+
+
+MIDNIGHT = 20_000 * 86400
+HOUR = 3600
+
+
+def mild_hours(days=2, rain=None, utc_offset=0):
+    """Hourly block of ``days`` mild dry days from local MIDNIGHT, with
+    ``rain`` mapping hours since then to millimetres."""
+    np = pytest.importorskip("numpy")
+    hours = days * 24
+    hourly = {variable: np.zeros(hours) for variable in advisory_engine.HOURLY_COLUMNS.values()}
+    hourly.update(
+        time=MIDNIGHT - utc_offset + np.arange(hours) * HOUR,
+        temperature_2m=np.full(hours, 20.0),
+        apparent_temperature=np.full(hours, 20.0),
+        relative_humidity_2m=np.full(hours, 50.0),
+    )
+    for hour, mm in (rain or {}).items():
+        hourly['precipitation'][hour] = mm
+    return hourly
+
+
+def test_routine_slots_are_judged_on_the_hour_their_text_names():
+    assert advisory_engine.ROUTINE_MINUTES['commute'] == 8 * 60 + 30
+    assert advisory_engine.ROUTINE_MINUTES['evening'] == 18 * 60 + 30
+    # Rain falling 08:00-09:00 is reported on the 09:00 row
+    routine = advisory_engine.hourly_routine(mild_hours(rain={9: 1.0}), 30)
+    assert "08:30 AM - 🚗 Leave 20m early (Traffic)" in routine
+    routine = advisory_engine.hourly_routine(mild_hours(rain={8: 1.0}), 30)
+    assert "08:45 AM - 🚇 Regular Commute" in routine
+
+
+def test_routine_uses_each_slots_next_occurrence():
+    # At 10:00 the morning and commute slots are tomorrow's, and come last
+    routine = advisory_engine.hourly_routine(mild_hours(rain={24 + 7: 1.0}), 30, now=MIDNIGHT + 10 * HOUR)
+    assert [line[:8] for line in routine] == ["01:00 PM", "03:00 PM", "06:30 PM", "07:00 AM", "08:45 AM"]
+    assert routine[3] == "07:00 AM - 🧘 Indoor Yoga (Rainy Start)"
+
+
+def test_routine_follows_the_location_clock():
+    # 10:00 UTC is 15:30 at UTC+5:30: only the evening slot is left today
+    routine = advisory_engine.hourly_routine(
+        mild_hours(days=3, utc_offset=19800), 30, utc_offset=19800, now=MIDNIGHT + 10 * HOUR,
+    )
+    assert [line[:8] for line in routine] == ["06:30 PM", "07:00 AM", "08:45 AM", "01:00 PM", "03:00 PM"]
+
+
+def test_routine_needs_hours_covering_every_slot():
+    assert advisory_engine.hourly_routine(mild_hours(days=1), 30, now=MIDNIGHT + 10 * HOUR) is None
+    assert advisory_engine.hourly_routine(mild_hours(days=1), 30, day=1) is None
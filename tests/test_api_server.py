@@ -0,0 +1,92 @@
+import asyncio
+import json
+import threading
+import time
+
+import api_server
+import weather_client
+import weather_core
+
+
+def call(method, path, body=None, query=b""):
+    """Run one request through the ASGI app; returns (status, decoded JSON)."""
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query}
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b""}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(api_server.app(scope, receive, send))
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+def test_batch_item_that_is_not_an_object_is_a_bad_request():
+    status, payload = call("POST", "/advisory/batch", {'locations': ["Paris"]})
+    assert status == 400
+    assert "object" in payload['error']
+
+
+def test_internal_errors_are_500_without_details(monkeypatch):
+    def broken(city):
+        raise KeyError("secret internals")
+
+    monkeypatch.setattr(weather_core, 'get_lat_lon', broken)
+    status, payload = call("GET", "/advisory", query=b"city=Paris")
+    assert status == 500
+    assert "secret" not in payload['error']
+
+
+def test_upstream_errors_are_502(monkeypatch):
+    def refused(city):
+        raise weather_client.CircuitOpenError("geocoding circuit open")
+
+    monkeypatch.setattr(weather_core, 'get_lat_lon', refused)
+    status, payload = call("GET", "/advisory", query=b"city=Paris")
+    assert status == 502
+    assert "circuit open" in payload['error']
+
+
+def test_batch_geocodes_distinct_cities_concurrently(monkeypatch):
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+    calls = []
+
+    def slow_lookup(city):
+        nonlocal in_flight, peak
+        with lock:
+            calls.append(city)
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.05)
+        with lock:
+            in_flight -= 1
+        # Nothing found keeps the test off the forecast path
+        return None
+
+    monkeypatch.setattr(weather_core, 'get_lat_lon', slow_lookup)
+    cities = [f"City {i}" for i in range(8)]
+    status, payload = call("POST", "/advisory/batch", {'locations': [{'city': city} for city in cities * 2]})
+    assert status == 200
+    assert sorted(calls) == sorted(cities)
+    assert peak > 1
+    assert [result['error'] for result in payload['results']] == ["not found"] * 16
+
+
+def test_batch_geocoding_failure_fails_only_that_item(monkeypatch):
+    def lookup(city):
+        if city == "Atlantis":
+            raise weather_client.CircuitOpenError("geocoding circuit open")
+        return None
+
+    monkeypatch.setattr(weather_core, 'get_lat_lon', lookup)
+    status, payload = call("POST", "/advisory/batch", {'locations': [{'city': "Atlantis"}, {'city': "Nowhere"}]})
+    assert status == 200
+    assert payload['results'] == [
+        {'query': {'city': "Atlantis"}, 'error': "geocoding failed: geocoding circuit open"},
+        {'query': {'city': "Nowhere"}, 'error': "not found"},
+    ]
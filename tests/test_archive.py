@@ -0,0 +1,66 @@
+import os
+import time
+
+import numpy as np
+
+import archive
+
+
+def write_partition(root, cell, days_ago, suffix='log'):
+    """One back-dated ``aqi`` partition with a row per hour of that day."""
+    day = int(time.time()) // archive.DAY - days_ago
+    rows = np.zeros(24, dtype=archive.schema('aqi'))
+    rows['time'] = day * archive.DAY + np.arange(24) * archive.HOUR
+    rows['european_aqi'] = 20
+    directory = os.path.join(root, cell)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{archive._day_name(day)}.aqi.{suffix}")
+    with open(path, 'wb') as f:
+        f.write(rows.tobytes())
+    return path
+
+
+def test_sweep_expires_and_compacts_cells_nobody_writes_to(tmp_path):
+    root = str(tmp_path)
+    idle = archive.cell_name(10.0, 20.0)
+    expired = write_partition(root, idle, days_ago=100, suffix='dat')
+    finished = write_partition(root, idle, days_ago=5)
+    recent = write_partition(root, idle, days_ago=1)
+
+    assert archive.Archive(root).sweep() == 1
+
+    assert not os.path.exists(expired)
+    assert not os.path.exists(finished)
+    assert os.path.exists(finished[:-len('log')] + 'dat')
+    assert os.path.exists(recent)
+
+
+def test_sweep_runs_at_most_once_per_interval(tmp_path):
+    root = str(tmp_path)
+    archive_ = archive.Archive(root, sweep_interval=3600)
+    assert archive_.sweep_if_due()
+
+    expired = write_partition(root, archive.cell_name(1.0, 2.0), days_ago=100)
+    assert not archive_.sweep_if_due()
+    assert os.path.exists(expired)
+
+    # Another process swept over an hour ago
+    marker = os.path.join(root, archive.SWEEP_MARKER)
+    os.utime(marker, (time.time() - 3601, time.time() - 3601))
+    assert archive_.sweep_if_due()
+    assert not os.path.exists(expired)
+
+
+def test_new_partition_sweeps_other_cells(tmp_path):
+    root = str(tmp_path)
+    expired = write_partition(root, archive.cell_name(1.0, 2.0), days_ago=100)
+    row = np.zeros(1, dtype=archive.schema('aqi'))
+    row['time'] = int(time.time())
+
+    archive.Archive(root)._write(51.5, -0.1, 'aqi', row)
+
+    for _ in range(100):
+        if not os.path.exists(expired):
+            break
+        time.sleep(0.02)
+    assert not os.path.exists(expired)
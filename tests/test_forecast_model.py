@@ -0,0 +1,70 @@
+import copy
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+import forecast_model
+
+RECORDED = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "payloads",
+                        "forecast.json")
+
+
+@pytest.fixture
+def payload():
+    with open(RECORDED, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def assert_same_forecast(actual, expected):
+    for name in ('latitude', 'longitude', 'utc_offset_seconds', 'timezone', 'elevation', 'current'):
+        assert getattr(actual, name) == getattr(expected, name), name
+    for block in ('hourly', 'daily'):
+        assert getattr(actual, block).keys() == getattr(expected, block).keys()
+        for name, array in getattr(expected, block).items():
+            assert getattr(actual, block)[name].dtype == array.dtype, name
+            np.testing.assert_array_equal(getattr(actual, block)[name], array, err_msg=name)
+
+
+def test_from_json_converts_times_to_utc_epochs(payload):
+    forecast = forecast_model.Forecast.from_json(payload)
+    # 12:00 in Kolkata (UTC+5:30)
+    assert forecast.current.time == datetime(2026, 10, 17, 6, 30, tzinfo=timezone.utc).timestamp()
+    assert forecast.current['temperature_2m'] == 26.4
+    assert forecast.hourly['time'].dtype == np.int64
+    assert forecast.hourly['temperature_2m'].dtype == np.float32
+    assert forecast.daily['sunrise'][0] == datetime(2026, 10, 17, 0, 36, tzinfo=timezone.utc).timestamp()
+    assert forecast.current_json()['time'] == payload['current']['time']
+
+
+def test_encode_decode_round_trip(payload):
+    forecast = forecast_model.Forecast.from_json(payload)
+    encoded = forecast_model.encode(forecast)
+    assert encoded.startswith(forecast_model.MAGIC)
+    decoded = forecast_model.decode(encoded)
+    assert_same_forecast(decoded, forecast)
+    assert len(decoded.hourly['time']) == len(payload['hourly']['time'])
+
+
+def test_missing_values_survive_as_nan(payload):
+    payload = copy.deepcopy(payload)
+    payload['hourly']['uv_index'][3] = None
+    payload['elevation'] = None
+    decoded = forecast_model.decode(forecast_model.encode(forecast_model.Forecast.from_json(payload)))
+    assert np.isnan(decoded.hourly['uv_index'][3])
+    assert not np.isnan(decoded.hourly['uv_index'][4])
+    assert decoded.elevation is None
+
+
+def test_decoded_arrays_are_read_only_views(payload):
+    decoded = forecast_model.decode(forecast_model.encode(forecast_model.Forecast.from_json(payload)))
+    with pytest.raises(ValueError):
+        decoded.hourly['temperature_2m'][0] = 0
+
+
+def test_decode_converts_legacy_json_entries(payload):
+    # What older versions cached: the raw response body
+    legacy = json.dumps(payload).encode()
+    assert_same_forecast(forecast_model.decode(legacy), forecast_model.Forecast.from_json(payload))
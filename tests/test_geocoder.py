@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import geocoder
+
+SAMPLE_DUMP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "cities_sample.txt")
+
+
+@pytest.fixture(scope='module')
+def index(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("geocoder") / "sample.idx")
+    places = geocoder.read_geonames(SAMPLE_DUMP, {'GB': "United Kingdom", 'CA': "Canada", 'US': "United States"})
+    assert geocoder.build_index(places, path)[0] == 7
+    return geocoder.GeoIndex(path)
+
+
+def test_lookup_picks_the_most_populous_match(index):
+    place = index.lookup("London")
+    assert place['country'] == "United Kingdom"
+    assert place['timezone'] == "Europe/London"
+    assert (place['latitude'], place['longitude']) == (51.50853, -0.12574)
+
+
+def test_lookup_matches_aliases_case_and_accents(index):
+    assert index.lookup("  LONDRES ")['country_code'] == "GB"
+    assert index.lookup("Bangalore")['name'] == "Bengaluru"
+    assert index.lookup("sao paulo")['name'] == "São Paulo"
+    assert index.lookup("São-Paulo")['name'] == "São Paulo"
+
+
+def test_lookup_misses(index):
+    assert index.lookup("Atlantis") is None
+    assert index.lookup("Lond") is None
+    assert index.lookup("?!") is None
+
+
+def test_country_name_falls_back_to_code(index):
+    assert index.lookup("Paris")['country'] == "FR"
+
+
+def test_suggest_ranks_prefix_matches_by_population(index):
+    assert [place['country_code'] for place in index.suggest("lon")] == ["GB", "CA", "US"]
+    assert [place['name'] for place in index.suggest("pa", limit=1)] == ["Paris"]
+    assert index.suggest("xyz") == []
+    assert index.suggest("") == []
+
+
+def test_suggest_lists_a_place_once_for_several_matching_names(index):
+    assert [place['name'] for place in index.suggest("b")] == ["Bengaluru"]
+
+
+def test_elevation_prefers_the_surveyed_value_then_the_dem(index):
+    assert index.suggest("london")[2]['elevation'] == 320.0
+    assert index.lookup("Bengaluru")['elevation'] == 920.0
+
+
+def test_unknown_elevation_is_none(index):
+    # GeoNames marks DEM no-data as -9999
+    assert index.lookup("Funafuti")['elevation'] is None
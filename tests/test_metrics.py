@@ -0,0 +1,34 @@
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def listener(monkeypatch):
+    monkeypatch.setattr(metrics, '_server', None)
+    host, port = metrics.serve(0, host="127.0.0.1")
+    yield f"http://{host}:{port}"
+    metrics._server.shutdown()
+    metrics._server.server_close()
+
+
+def test_serve_exposes_render_at_metrics(listener):
+    with metrics.timer('test_scrape'):
+        pass
+    with urlopen(listener + "/metrics") as response:
+        assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+        body = response.read().decode()
+    assert 'weatherwise_stage_seconds_count{stage="test_scrape"} 1' in body
+
+
+def test_serve_starts_once_per_process(listener):
+    assert metrics.serve(0, host="127.0.0.1") == metrics._server.server_address
+
+
+def test_other_paths_are_not_found(listener):
+    with pytest.raises(HTTPError) as error:
+        urlopen(listener + "/")
+    assert error.value.code == 404
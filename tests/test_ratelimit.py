@@ -0,0 +1,154 @@
+from email.utils import formatdate
+from urllib.parse import urlsplit
+
+import pytest
+
+import ratelimit
+import weather_client
+
+
+START = 1000.0
+
+
+class FakeClock:
+    """Stands in for the time module; sleeping just moves it forward, by at
+    least a microsecond like a real sleep."""
+
+    def __init__(self, now=START):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 1e-6)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def limiter(monkeypatch, clock):
+    # 10 tokens a second, 50 in a full bucket
+    limiter = ratelimit.RateLimiter(ratelimit.MemoryBucketStore(), per_minute=600, burst_seconds=5)
+    monkeypatch.setattr(ratelimit, 'get_limiter', lambda: limiter)
+    return limiter
+
+
+def elapsed(seconds):
+    return pytest.approx(START + seconds, abs=1e-4)
+
+
+def tokens(limiter, name):
+    return limiter.store._buckets[name][0]
+
+
+def test_bucket_refills_at_the_rate_up_to_capacity(limiter, clock):
+    limiter.acquire('forecast', cost=50)
+    clock.sleep(2)
+    limiter.acquire('forecast', cost=20)
+    assert clock.now == START + 2
+    # Empty again: one more token takes a tenth of a second
+    limiter.acquire('forecast')
+    assert clock.now == elapsed(2.1)
+
+    clock.sleep(3600)
+    limiter.acquire('forecast', cost=0)
+    assert tokens(limiter, 'forecast') == 50
+
+
+def test_background_leaves_the_reserve_to_interactive(limiter, clock):
+    limiter.acquire('forecast', cost=20)
+    # 30 left, 25 of them reserved: background waits until 35 are there
+    limiter.acquire('forecast', cost=10, priority=ratelimit.BACKGROUND)
+    assert clock.now == elapsed(0.5)
+    # Interactive may take the reserve at once
+    limiter.acquire('forecast', cost=25)
+    assert clock.now == elapsed(0.5)
+    assert tokens(limiter, 'forecast') == pytest.approx(0)
+
+
+def test_interactive_gives_up_sooner_than_background(limiter, clock):
+    limiter.acquire('forecast', cost=50)
+    with pytest.raises(ratelimit.RateLimitedError):
+        limiter.acquire('forecast', cost=30)
+    assert clock.now == START
+    limiter.acquire('forecast', cost=30, priority=ratelimit.BACKGROUND)
+    assert clock.now == elapsed(5)
+
+
+def test_pause_holds_every_caller_off(limiter, clock):
+    limiter.pause('forecast', 10)
+    with pytest.raises(ratelimit.RateLimitedError):
+        limiter.acquire('forecast')
+    limiter.acquire('forecast', priority=ratelimit.BACKGROUND)
+    assert clock.now == elapsed(10)
+    # Other endpoints are not paused
+    limiter.acquire('air_quality')
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ("120", 120),
+    ("1.5", 1.5),
+    ("-3", 0),
+    (None, ratelimit.RETRY_AFTER_DEFAULT),
+    ("soon", ratelimit.RETRY_AFTER_DEFAULT),
+])
+def test_parse_retry_after_seconds(value, seconds):
+    assert ratelimit.parse_retry_after(value) == seconds
+
+
+def test_parse_retry_after_http_date(clock):
+    assert ratelimit.parse_retry_after(formatdate(clock.now + 30, usegmt=True)) == pytest.approx(30)
+    assert ratelimit.parse_retry_after(formatdate(clock.now - 30, usegmt=True)) == 0
+
+
+def test_acquire_takes_its_cost(limiter):
+    limiter.acquire('forecast', cost=20)
+    limiter.acquire('forecast', cost=20)
+    assert tokens(limiter, 'forecast') == 10
+
+
+def test_cost_beyond_capacity_waits_for_a_full_bucket_and_leaves_debt(limiter, clock):
+    limiter.acquire('forecast', cost=40)
+    limiter.acquire('forecast', cost=120, priority=ratelimit.BACKGROUND)
+    # Waited for the bucket to refill to 50, then went 70 into debt
+    assert clock.now == elapsed(4)
+    assert tokens(limiter, 'forecast') == -70
+
+
+def test_buckets_are_per_host(limiter):
+    limiter.acquire('forecast', cost=50, host="localhost:8080")
+    limiter.acquire('forecast', cost=50, host="api.open-meteo.com")
+    assert tokens(limiter, "localhost:8080/forecast") == 0
+    assert tokens(limiter, "api.open-meteo.com/forecast") == 0
+
+
+def test_batched_fetch_costs_every_location(monkeypatch, limiter, clock):
+    sent = []
+
+    def get_json(endpoint, url, params):
+        points = params['latitude'].split(",")
+        sent.append((clock.now, len(points)))
+        return [{}] * len(points)
+
+    monkeypatch.setattr(weather_client, '_get_json', get_json)
+    weight = weather_client.CALL_WEIGHTS['forecast']
+    assert weight == pytest.approx(1.9)
+
+    with ratelimit.background():
+        results = weather_client.fetch_forecast_batch([(51.5, -0.1)] * 150)
+
+    assert len(results) == 150
+    # The first 100 locations (190 calls) put the bucket 140 in debt; the
+    # second request waits until it is full again
+    assert sent == [(START, 100), (elapsed(19), 50)]
+    bucket = f"{urlsplit(weather_client.FORECAST_URL).netloc}/forecast"
+    assert tokens(limiter, bucket) == pytest.approx(50 - 50 * weight)
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+import weather_cache
+
+
+def shared_caches(tmp_path, count=2):
+    """Caches on one SQLite file, like separate worker processes."""
+    path = str(tmp_path / "cache.sqlite3")
+    return [weather_cache.Cache(weather_cache.SQLiteBackend(path)) for _ in range(count)]
+
+
+def lead_fetch(cache, key, fetch):
+    """Run ``cache.get_or_fetch`` on a thread; returns the thread, an event
+    set once the fetch holds the cross-process lock, and the outcome dict."""
+    started = threading.Event()
+    outcome = {}
+
+    def leader_fetch():
+        started.set()
+        return fetch()
+
+    def run():
+        try:
+            outcome['value'] = cache.get_or_fetch(key, leader_fetch, ttl=60)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(5)
+    return thread, outcome
+
+
+def test_waiter_gets_the_leaders_value(tmp_path):
+    leader, waiter = shared_caches(tmp_path)
+
+    def slow_fetch():
+        time.sleep(0.3)
+        return "from leader"
+
+    thread, outcome = lead_fetch(leader, "forecast:1", slow_fetch)
+    value = waiter.get_or_fetch("forecast:1", lambda: pytest.fail("waiter fetched upstream"), ttl=60)
+    thread.join()
+    assert value == outcome['value'] == "from leader"
+    assert waiter.stats()['coalesced_remote'] == 1
+
+
+def test_waiter_takes_over_when_the_leader_fails(tmp_path):
+    leader, waiter = shared_caches(tmp_path)
+
+    def failing_fetch():
+        time.sleep(0.3)
+        raise ConnectionError("upstream down")
+
+    thread, outcome = lead_fetch(leader, "forecast:1", failing_fetch)
+    start = time.monotonic()
+    value = waiter.get_or_fetch("forecast:1", lambda: "from waiter", ttl=60)
+    elapsed = time.monotonic() - start
+    thread.join()
+    assert isinstance(outcome['error'], ConnectionError)
+    assert value == "from waiter"
+    # Well under LOCK_TTL: the waiter noticed the lock was let go
+    assert elapsed < 2
+    assert waiter.stats()['fetched'] == 1
+    # The takeover's lock is released again
+    assert leader.backend.acquire_lock("forecast:1", weather_cache.LOCK_TTL)
+
+
+class FakeRedisServer:
+    """Just the Redis calls RedisBackend's locks make, with the release
+    script's compare-and-delete done in Python."""
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, name, value, nx=False, px=None):
+        current = self.data.get(name)
+        if nx and current is not None and current[1] > time.time():
+            return None
+        self.data[name] = (value, time.time() + px / 1000)
+        return True
+
+    def register_script(self, script):
+        def release(keys, args):
+            current = self.data.get(keys[0])
+            if current is not None and current[1] > time.time() and current[0] == args[0]:
+                del self.data[keys[0]]
+                return 1
+            return 0
+        return release
+
+
+def test_redis_lock_release_leaves_a_later_holders_lock(monkeypatch):
+    server = FakeRedisServer()
+    fake_redis = type('redis', (), {'Redis': type('Redis', (), {'from_url': staticmethod(lambda url: server)})})
+    monkeypatch.setattr(weather_cache, 'redis', fake_redis, raising=False)
+    monkeypatch.setattr(weather_cache, 'REDIS_AVAILABLE', True)
+    first, second, third = (weather_cache.RedisBackend("redis://cache") for _ in range(3))
+
+    assert first.acquire_lock("k", 0.05)
+    assert not second.acquire_lock("k", 60)
+    time.sleep(0.06)
+    # The first holder's lock expired mid-fetch and the second took over
+    assert second.acquire_lock("k", 60)
+    first.release_lock("k")
+    assert not third.acquire_lock("k", 60)
+    second.release_lock("k")
+    assert third.acquire_lock("k", 60)
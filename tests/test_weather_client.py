@@ -0,0 +1,170 @@
+import pytest
+import requests
+
+import ratelimit
+import weather_client
+
+
+class FakeClock:
+    """Stands in for the time module; sleeping just moves it forward."""
+
+    def __init__(self, now=1_000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(weather_client, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    breaker = weather_client.CircuitBreaker('forecast', failure_threshold=3, reset_timeout=30)
+    monkeypatch.setitem(weather_client.BREAKERS, 'forecast', breaker)
+    monkeypatch.setattr(ratelimit, 'get_limiter', lambda: None)
+    return breaker
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Stub for _get_json answering with the outcomes queued in ``errors``,
+    the last one repeatedly; None is a successful call."""
+    class Upstream:
+        calls = 0
+        errors = []
+
+    def get_json(endpoint, url, params):
+        Upstream.calls += 1
+        error = Upstream.errors.pop(0) if len(Upstream.errors) > 1 else next(iter(Upstream.errors), None)
+        if error is not None:
+            raise error
+        return {'ok': True}
+
+    monkeypatch.setattr(weather_client, '_get_json', get_json)
+    return Upstream
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+def fetch():
+    return weather_client.fetch_json('forecast', "http://upstream.test/v1/forecast", {})
+
+
+def test_breaker_opens_at_threshold(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    with pytest.raises(weather_client.CircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_the_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+
+
+def test_half_open_lets_exactly_one_trial_through(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.sleep(29)
+    with pytest.raises(weather_client.CircuitOpenError):
+        breaker.before_call()
+
+    clock.sleep(1)
+    breaker.before_call()
+    assert breaker.state == 'half_open'
+    with pytest.raises(weather_client.CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_for_a_full_timeout(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.sleep(30)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    clock.sleep(29)
+    with pytest.raises(weather_client.CircuitOpenError):
+        breaker.before_call()
+
+
+def test_trial_without_a_rate_limit_slot_is_abandoned(monkeypatch, breaker, clock, upstream):
+    class Exhausted:
+        def acquire(self, endpoint, **kwargs):
+            raise ratelimit.RateLimitedError("quota exhausted")
+
+    monkeypatch.setattr(ratelimit, 'get_limiter', Exhausted)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.sleep(30)
+
+    with pytest.raises(ratelimit.RateLimitedError):
+        fetch()
+    assert upstream.calls == 0
+    # Back to open, and the next call gets the trial
+    assert breaker.state == 'open'
+    breaker.before_call()
+    assert breaker.state == 'half_open'
+
+
+def test_client_errors_are_neither_retried_nor_failures(breaker, upstream):
+    upstream.errors = [http_error(404)]
+    for _ in range(5):
+        with pytest.raises(requests.HTTPError):
+            fetch()
+    assert upstream.calls == 5
+    assert breaker.state == 'closed'
+    assert breaker._failures == 0
+
+
+def test_server_errors_are_retried_then_count_once(breaker, upstream):
+    upstream.errors = [http_error(503)]
+    with pytest.raises(requests.HTTPError):
+        fetch()
+    assert upstream.calls == 1 + weather_client.RETRIES
+    assert breaker._failures == 1
+
+
+def test_read_timeout_is_not_retried_but_counts(breaker, upstream):
+    upstream.errors = [requests.ReadTimeout("read timed out")]
+    with pytest.raises(requests.ReadTimeout):
+        fetch()
+    assert upstream.calls == 1
+    assert breaker._failures == 1
+
+
+def test_connect_timeout_is_retried(breaker, upstream):
+    upstream.errors = [requests.ConnectTimeout("connect timed out")]
+    with pytest.raises(requests.ConnectTimeout):
+        fetch()
+    assert upstream.calls == 1 + weather_client.RETRIES
+
+
+def test_retry_that_succeeds_records_success(breaker, upstream):
+    breaker.record_failure()
+    upstream.errors = [requests.ConnectionError("reset"), requests.ConnectionError("reset"), None]
+    assert fetch() == {'ok': True}
+    assert upstream.calls == 3
+    assert breaker._failures == 0
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+import archive
+import forecast_model
+import prefetch
+import weather_cache
+import weather_client
+import weather_core
+
+# 2.2 km apart, in neighbouring grid cells
+POINT_A = (51.49, -0.11)
+POINT_B = (51.51, -0.11)
+
+
+@pytest.fixture
+def isolated(tmp_path, monkeypatch):
+    """A fresh in-memory cache and archive, no prefetcher, and a stub
+    air-quality upstream; returns the cells it was asked for."""
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(weather_cache, '_cache', weather_cache.Cache(weather_cache.MemoryBackend()))
+    monkeypatch.setattr(archive, 'ENABLED', True)
+    monkeypatch.setattr(archive, '_archive', archive.Archive(str(tmp_path)))
+    monkeypatch.setattr(prefetch, 'ENABLED', False)
+    monkeypatch.setattr(weather_core, 'NEARBY_KM', 8.0)
+    requested = []
+    hour = time.strftime("%Y-%m-%dT%H:00", time.gmtime())
+
+    def fetch_air_quality_batch(cells):
+        requested.extend(cells)
+        return [{'current': {'time': hour, 'european_aqi': 42}, 'utc_offset_seconds': 0} for _ in cells]
+
+    monkeypatch.setattr(weather_client, 'fetch_air_quality_batch', fetch_air_quality_batch)
+    return requested
+
+
+def test_cells_report_the_neighbour_that_answered(isolated):
+    assert weather_cache.grid_cell(*POINT_A) != weather_cache.grid_cell(*POINT_B)
+    _, (cell_a,) = weather_core.get_aqi_cells([POINT_A])
+    values, (cell_b,) = weather_core.get_aqi_cells([POINT_B])
+    assert values[0]['current']['european_aqi'] == 42
+    assert isolated == [cell_a]
+    assert cell_b == cell_a
+
+
+def test_last_known_aqi_finds_readings_archived_under_the_neighbour(isolated):
+    weather_core.get_aqi_cells([POINT_A])
+    weather_core.get_aqi_cells([POINT_B])
+    fallback_a, fallback_b = weather_core.last_known_aqi([POINT_A, POINT_B])
+    assert fallback_b is not None
+    assert fallback_b == fallback_a
+    assert fallback_b['cell'] == weather_cache.grid_cell(*POINT_A)
+    assert fallback_b['current'] == {'european_aqi': 42}
+
+
+def test_last_known_aqi_stays_within_nearby_range(isolated, monkeypatch):
+    weather_core.get_aqi_cells([POINT_A])
+    monkeypatch.setattr(weather_core, 'NEARBY_KM', 0)
+    assert weather_core.last_known_aqi([POINT_B]) == [None]
+
+
+def test_nearby_lookup_reads_each_candidate_once_and_skips_stale_ones(isolated, monkeypatch):
+    cache = weather_cache.get_cache()
+    cell_a = weather_cache.grid_cell(*POINT_A)
+    cell_b = weather_cache.grid_cell(*POINT_B)
+    payload = b'{"elevation": 20}'
+    cache.backend.set(weather_core.forecast_key(cell_a), payload, time.time() - 1, time.time() + 3600)
+    reads = []
+    peeked = []
+    backend_get = cache.backend.get
+    monkeypatch.setattr(cache.backend, 'get', lambda key: reads.append(key) or backend_get(key))
+
+    def elevation_of(payload):
+        peeked.append(payload)
+        return forecast_model.peek_elevation(payload)
+
+    # A stale neighbour neither answers nor gets its payload looked into
+    assert weather_core.nearby_cached_cell(
+        cache, weather_core.forecast_key, POINT_B, cell_b, 25, elevation_of) == cell_b
+    assert peeked == []
+    assert len(reads) == len(set(reads))
+
+    cache.backend.set(weather_core.forecast_key(cell_a), payload, time.time() + 60, time.time() + 3600)
+    assert weather_core.nearby_cached_cell(
+        cache, weather_core.forecast_key, POINT_B, cell_b, 25, elevation_of) == cell_a
+    assert peeked == [payload]
+    # Too far above or below doesn't count as near
+    assert weather_core.nearby_cached_cell(
+        cache, weather_core.forecast_key, POINT_B, cell_b, 500, elevation_of) == cell_b
@@ -1,12 +1,21 @@
 import streamlit as st
-import requests
-import pandas as pd
-from datetime import datetime
-try:
-    import plotly.graph_objects as go
-    PLOTLY_AVAILABLE = True
-except ImportError:
-    PLOTLY_AVAILABLE = False
+import importlib.util
+import os
+import charts
+import metrics
+import weather_cache
+import weather_core
+from weather_core import generate_smart_advisory, get_aqi_status, get_conditions_batch, get_weather_and_aqi
+# pandas and plotly are slow to import, so they load where the chart is drawn
+# (plotly inside charts.py); find_spec only checks it is installed without importing it
+PLOTLY_AVAILABLE = importlib.util.find_spec("plotly") is not None
+# Show the metrics panel to everyone; otherwise it appears with ?debug=1
+DEBUG_PANEL = os.environ.get("WEATHERWISE_DEBUG_PANEL", "0") == "1"
+# Prometheus scrape port for this Streamlit process (one per process), listening
+# from the first session on; unset leaves its metrics in the debug panel only
+METRICS_PORT = os.environ.get("WEATHERWISE_METRICS_PORT")
+if METRICS_PORT:
+    metrics.serve(int(METRICS_PORT))
 
 # Page config
 st.set_page_config(
@@ -17,7 +26,7 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
+APP_CSS = """
 <style>
     .main {
         background-color: #0e1117;
@@ -57,219 +66,133 @@ st.markdown("""
         border-radius: 8px;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
 # API Helper Functions
-@st.cache_data(ttl=3600)
+# Fetching, caching and the advisory engine live in weather_core, shared with api_server
 def get_lat_lon(city_name):
-    url = f"https://geocoding-api.open-meteo.com/v1/search?name={city_name}&count=1&language=en&format=json"
     try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        if data.get('results'):
-            return data['results'][0]
-        return None
+        return weather_core.get_lat_lon(city_name)
     except Exception as e:
         st.error(f"Geocoding error: {e}")
         return None
 
-@st.cache_data(ttl=1800)
-def get_weather_data(lat, lon):
-    url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,apparent_temperature,is_day,precipitation,weather_code,wind_speed_10m&hourly=temperature_2m,precipitation_probability&daily=sunrise,sunset,uv_index_max&timezone=auto"
-    response = requests.get(url, timeout=10)
-    return response.json()
+# Widgets inside a fragment rerun only that fragment, so typing in the search
+# box, signing out or removing a saved city doesn't rebuild the whole page.
+# What the main view does rebuild is memoized per session on its inputs.
+def memoized(name, inputs, build):
+    """This session's last ``build()`` result for ``name``, rebuilt only when ``inputs`` change."""
+    cached = st.session_state.render_cache.get(name)
+    if cached is None or cached[0] != inputs:
+        cached = (inputs, build())
+        st.session_state.render_cache[name] = cached
+    return cached[1]
 
-@st.cache_data(ttl=1800)
-def get_aqi_data(lat, lon):
-    url = f"https://air-quality-api.open-meteo.com/v1/air-quality?latitude={lat}&longitude={lon}&current=european_aqi"
-    response = requests.get(url, timeout=10)
-    return response.json()
+CHART_RANGES = {"24 hours": 24, "7 days": None}
 
-# Advisory Generation Logic
-def generate_smart_advisory(current, daily, aqi):
-    temp = current['temperature_2m']
-    feels_like = current['apparent_temperature']
-    humidity = current['relative_humidity_2m']
-    wind = current['wind_speed_10m']
-    rain = current['precipitation']
-    is_day = current['is_day']
-    uv_index = daily['uv_index_max'][0]
-    weather_code = current['weather_code']
-    
-    outfit = []
-    hygiene = []
-    lifestyle = []
-    routine = []
-    
-    # WARDROBE LOGIC
-    if feels_like < 5:
-        outfit.append("❄️ Base: Thermal innerwear + Woolen sweater + Heavy Coat.")
-    elif feels_like < 12:
-        outfit.append("🧥 Base: Puffer jacket or Heavy trench coat.")
-    elif feels_like < 18:
-        outfit.append("🧣 Base: Hoodie, Cardigan, or Denim jacket.")
-    elif feels_like < 25:
-        outfit.append("👕 Base: Long-sleeve t-shirt or Flannels.")
-    elif feels_like < 30:
-        outfit.append("👚 Base: Breathable cotton or linen. Short sleeves.")
-    else:
-        outfit.append("🎽 Base: Loose-fit synthetics. Shorts/Skirts permitted.")
-    
-    # Footwear
-    if rain > 0.5:
-        outfit.append("👢 Shoes: Waterproof boots or gumboots. Avoid suede.")
-    elif rain > 0:
-        outfit.append("👟 Shoes: Water-resistant leather sneakers. No canvas..")
-    elif temp > 30:
-        outfit.append("👡 Shoes: Open-toe sandals or breathable mesh trainers.")
-    elif feels_like < 10:
-        outfit.append("🧦 Shoes: Insulated boots with thick wool socks.")
-    else:
-        outfit.append("👞 Shoes: Comfortable loafers or casual sneakers.")
-    
-    # Fabrics & Colors
-    if temp > 28 and is_day:
-        outfit.append("🎨 Style: Wear light colors (white/beige) to reflect heat.")
-        outfit.append("🧵 Fabric: Opt for 100% Linen or Cotton.")
-    elif feels_like < 15:
-        outfit.append("🎨 Style: Dark colors absorb heat better today.")
-        outfit.append("🧵 Fabric: Fleece, Wool, or Cashmere blends.")
-    else:
-        outfit.append("🎨 Style: Any color works today.")
-        outfit.append("🧵 Fabric: Comfortable cotton blends or light layers.")
-    
-    # Accessories
-    accessories_added = False
-    if rain > 0.0:
-        if wind > 20:
-            outfit.append("🚫 Warning: Wind is too strong for umbrellas! Use a raincoat.")
-        else:
-            outfit.append("☂️ Gear: Carry a sturdy umbrella.")
-        accessories_added = True
-    if uv_index > 5 and is_day:
-        outfit.append("🕶️ Extras: Polarized sunglasses & wide-brim hat required.")
-        accessories_added = True
-    if not accessories_added:
-        outfit.append("🎒 Extras: A standard backpack or handbag is sufficient.")
-    
-    # SELF CARE
-    if humidity < 35:
-        hygiene.append("🧴 Skin: Dry air alert. Use oil-based moisturizer & lip balm.")
-    elif humidity > 75:
-        hygiene.append("🧼 Skin: High humidity. Use gel-based moisturizer. Carry blotting paper.")
-    else:
-        hygiene.append("✨ Skin: Balanced humidity. Standard lotion is fine.")
-    
-    # Sun Protection
-    if uv_index >= 8 and is_day:
-        hygiene.append("🛡️ SPF: Extreme UV. Apply SPF 50+ every 2 hours.")
-    elif uv_index >= 5 and is_day:
-        hygiene.append("🛡️ SPF: High UV. Apply SPF 30+ before stepping out.")
-    elif is_day:
-        hygiene.append("🛡️ SPF: Low UV. Daily SPF 15 moisturizer is sufficient.")
-    else:
-        hygiene.append("🌙 Care: No UV concern. Focus on night-time skincare routine.")
-    
-    # Hair & Eyes
-    dew_point = temp - ((100 - humidity) / 5)
-    hair_eye_added = False
-    if dew_point > 20:
-        hygiene.append("🦁 Hair: Severe Frizz Alert! Use anti-humidity serum.")
-        hair_eye_added = True
-    if wind > 20 and is_day:
-        hygiene.append("👁️ Eyes: Windy & bright. Wear sunglasses to prevent dry eyes.")
-        hair_eye_added = True
-    if not hair_eye_added:
-        hygiene.append("👀 Eyes & Hair: Conditions are mild. Standard care applies.")
-    
-    # Hydration
-    if temp > 30:
-        hygiene.append("🥤 Hydration: Add electrolytes to your water today.")
-    elif temp < 15:
-        hygiene.append("🍵 Hydration: Warm herbal teas will keep you hydrated.")
-    else:
-        hygiene.append("💧 Hydration: Maintain distinct daily water intake (approx 2.5L).")
-    
-    # LIFESTYLE
-    if aqi < 50 and rain == 0:
-        lifestyle.append("🏃 Exercise: Perfect conditions for an outdoor run.")
-    elif rain > 0:
-        lifestyle.append("🧘 Exercise: Rainy day. Try Yoga or Calisthenics indoors.")
-    elif aqi >= 100:
-        lifestyle.append("😷 Health: Air is poor. Gym workout only. Wear mask outdoors.")
-    else:
-        lifestyle.append("💪 Exercise: Weather is neutral. Good for a gym session or light jog.")
-    
-    # Food & Diet
-    if temp > 32:
-        lifestyle.append("🥗 Diet: Eat cooling foods like cucumber, melons, and salads.")
-    elif temp < 15:
-        lifestyle.append("🍲 Diet: Hearty soups and root vegetables recommended.")
-    else:
-        lifestyle.append("🍎 Diet: Balanced weather. Great time for fresh fruits and veggies.")
-    
-    # Productivity & Mood
-    if rain > 0 or weather_code > 50:
-        lifestyle.append("🎧 Focus: Gloomy weather is perfect for deep work. Use lo-fi beats.")
-    elif is_day and 20 < temp < 30:
-        lifestyle.append("💡 Focus: Great weather! Take walking meetings if possible.")
-    else:
-        lifestyle.append("✨ Mood: Steady weather. Good for clearing your backlog.")
-    
-    # Home Environment
-    if humidity > 70:
-        lifestyle.append("🏠 Home: Run a dehumidifier or AC dry mode to prevent mold.")
-    elif humidity < 30:
-        lifestyle.append("🏠 Home: Air is dry. Use a humidifier for better sleep.")
-    else:
-        lifestyle.append("🏠 Home: Indoor climate is comfortable. Open windows for fresh air.")
-    
-    # DAILY ROUTINE
-    if rain > 0:
-        routine.append("07:00 AM - 🧘 Indoor Yoga (Rainy Start)")
-    elif aqi < 50:
-        routine.append("07:00 AM - 🏃 Morning Run (Clean Air)")
-    else:
-        routine.append("07:00 AM - 🏋️ Gym Workout / Stretching")
-    
-    if rain > 0.5:
-        routine.append("08:30 AM - 🚗 Leave 20m early (Traffic)")
-    else:
-        routine.append("08:45 AM - 🚇 Regular Commute")
-    
-    if temp > 30:
-        routine.append("01:00 PM - 🥗 Light Salad Lunch (Heat)")
-    elif temp < 15:
-        routine.append("01:00 PM - 🍜 Hot Soup & Sandwich")
-    else:
-        routine.append("01:00 PM - 🍱 Balanced Healthy Lunch")
-    
-    if temp > 28:
-        routine.append("03:00 PM - 🥤 Hydration Break (Iced Tea)")
-    else:
-        routine.append("03:00 PM - ☕ Coffee/Tea Break")
-    
-    if rain == 0 and 15 < temp < 27:
-        routine.append("06:30 PM - 🚶 Evening Walk / Park")
-    elif aqi > 100:
-        routine.append("06:30 PM - 🏠 Indoor Hobby (Bad Air)")
+@st.fragment
+def hourly_chart(forecast):
+    # Switching the range reruns only this fragment. Figures and specs come
+    # from charts.py, built once per forecast version for every session; the
+    # 7-day view (and the no-plotly fallback) is a downsampled Vega-Lite spec
+    choice = st.radio("Range", list(CHART_RANGES), horizontal=True, label_visibility="collapsed", key="chart_range")
+    hours = CHART_RANGES[choice]
+    if hours is not None and PLOTLY_AVAILABLE:
+        st.plotly_chart(charts.temperature_figure(forecast, hours), use_container_width=True)
     else:
-        routine.append("06:30 PM - 📖 Reading / Relaxation")
-    
-    return {
-        'outfit': outfit,
-        'hygiene': hygiene,
-        'lifestyle': lifestyle,
-        'routine': routine
-    }
+        st.vega_lite_chart(charts.temperature_vega(forecast, hours), use_container_width=True)
+
+ADVISORY_CARDS = [
+    # key, emoji, title, background/border rgb, heading color
+    ('outfit', "👔", "Daily Wardrobe", "37, 99, 235", "#93c5fd"),
+    ('hygiene', "✨", "Self Care Rituals", "245, 158, 11", "#fcd34d"),
+    ('lifestyle', "☕", "Lifestyle & Diet", "16, 185, 129", "#6ee7b7"),
+    ('routine', "🕐", "Upcoming Routine", "139, 92, 246", "#c4b5fd"),
+]
+
+def advisory_card(emoji, title, rgb, color, items):
+    # One markdown call per card rather than one per bullet
+    bullets = "".join(f"<p style='font-size: 14px; line-height: 1.6; margin: 8px 0;'>• {item}</p>" for item in items)
+    return f"""
+    <div style='background-color: rgba({rgb}, 0.1); border: 1px solid rgba({rgb}, 0.3); border-radius: 12px; padding: 20px; height: 100%;'>
+        <h3 style='color: {color}; margin-top: 0; display: flex; align-items: center; gap: 8px;'>
+            <span>{emoji}</span> {title}
+        </h3>
+        {bullets}
+    </div>
+    """
+
+@st.fragment
+def search_box():
+    search_col1, search_col2 = st.columns([3, 1])
+    with search_col1:
+        city_input = st.text_input("", value=st.session_state.city, placeholder="Search city...", label_visibility="collapsed")
+    with search_col2:
+        if st.button("Search", use_container_width=True) and city_input != st.session_state.city:
+            st.session_state.city = city_input
+            st.rerun()
+
+@st.fragment
+def account_menu():
+    logout_col1, logout_col2 = st.columns([3, 1])
+    with logout_col1:
+        st.markdown(f"""
+        <div style='text-align: right; padding-top: 10px;'>
+            <p style='margin: 0; font-size: 12px; color: #9ca3af;'>Hello,</p>
+            <p style='margin: 0; font-size: 14px; font-weight: bold;'>{st.session_state.user_name}</p>
+        </div>
+        """, unsafe_allow_html=True)
+    with logout_col2:
+        if st.button("🚪", help="Sign Out"):
+            st.session_state.authenticated = False
+            st.session_state.user_name = ""
+            st.session_state.render_cache = {}
+            st.rerun()
 
-def get_aqi_status(aqi_value):
-    if aqi_value < 40:
-        return "Good", "🟢"
-    elif aqi_value < 80:
-        return "Moderate", "🟡"
+def save_city(location):
+    # A click callback runs before the rerun, so the page it triggers already
+    # shows the city saved; elevation keeps nearby-cell lookups height-aware
+    st.session_state.saved_cities.append({
+        'name': location['name'],
+        'country': location.get('country', ''),
+        'latitude': location['latitude'],
+        'longitude': location['longitude'],
+        'elevation': location.get('elevation'),
+    })
+
+@st.fragment
+def saved_cities_dashboard():
+    render_clock = metrics.Stopwatch()
+    st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown("### ⭐ Saved Cities")
+    
+    saved_cities = st.session_state.saved_cities
+    saved_results, saved_errors = get_conditions_batch(saved_cities)
+    if 'forecast' in saved_errors:
+        st.error(f"Forecast error: {saved_errors['forecast']}")
     else:
-        return "Poor", "🔴"
+        saved_aqi = saved_results.get('air_quality') or [None] * len(saved_cities)
+        for row_start in range(0, len(saved_cities), 4):
+            city_cols = st.columns(4)
+            for city_col, i in zip(city_cols, range(row_start, min(row_start + 4, len(saved_cities)))):
+                saved = saved_cities[i]
+                saved_current = saved_results['forecast'][i].current
+                city_aqi = saved_aqi[i]['current']['european_aqi'] if saved_aqi[i] else None
+                city_status, city_emoji = get_aqi_status(city_aqi)
+                with city_col:
+                    st.markdown(f"""
+                    <div class='advisory-card'>
+                        <h4 style='margin: 0;'>{saved['name']}</h4>
+                        <p style='margin: 0; color: #9ca3af; font-size: 12px;'>{saved['country']}</p>
+                        <p style='margin: 8px 0 0 0; font-size: 28px; font-weight: bold;'>{saved_current['temperature_2m']}°C</p>
+                        <p style='margin: 0; font-size: 13px;'>Feels like {saved_current['apparent_temperature']}°C · 💧 {saved_current['relative_humidity_2m']}%</p>
+                        <p style='margin: 0; font-size: 13px;'>{city_emoji} AQI {city_aqi if city_aqi is not None else "N/A"} ({city_status})</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+                    # The callback runs before the fragment reruns, so no extra rerun is needed
+                    st.button("✖ Remove", key=f"remove_{i}_{saved['name']}", on_click=st.session_state.saved_cities.pop, args=(i,))
+    render_clock.lap('render_saved_cities')
 
 # Initialize session state
 if 'authenticated' not in st.session_state:
@@ -278,6 +201,10 @@ if 'user_name' not in st.session_state:
     st.session_state.user_name = ""
 if 'city' not in st.session_state:
     st.session_state.city = "Bengaluru"
+if 'saved_cities' not in st.session_state:
+    st.session_state.saved_cities = []
+if 'render_cache' not in st.session_state:
+    st.session_state.render_cache = {}
 
 # Authentication Screen
 if not st.session_state.authenticated:
@@ -328,28 +255,10 @@ else:
         """, unsafe_allow_html=True)
     
     with col2:
-        search_col1, search_col2 = st.columns([3, 1])
-        with search_col1:
-            city_input = st.text_input("", value=st.session_state.city, placeholder="Search city...", label_visibility="collapsed")
-        with search_col2:
-            if st.button("Search", use_container_width=True):
-                st.session_state.city = city_input
-                st.rerun()
+        search_box()
     
     with col3:
-        logout_col1, logout_col2 = st.columns([3, 1])
-        with logout_col1:
-            st.markdown(f"""
-            <div style='text-align: right; padding-top: 10px;'>
-                <p style='margin: 0; font-size: 12px; color: #9ca3af;'>Hello,</p>
-                <p style='margin: 0; font-size: 14px; font-weight: bold;'>{st.session_state.user_name}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        with logout_col2:
-            if st.button("🚪", help="Sign Out"):
-                st.session_state.authenticated = False
-                st.session_state.user_name = ""
-                st.rerun()
+        account_menu()
     
     st.markdown("<br>", unsafe_allow_html=True)
     
@@ -358,16 +267,35 @@ else:
         location_data = get_lat_lon(st.session_state.city)
         
         if location_data:
-            weather_data = get_weather_data(location_data['latitude'], location_data['longitude'])
-            aqi_data = get_aqi_data(location_data['latitude'], location_data['longitude'])
+            results, errors = get_weather_and_aqi(location_data['latitude'], location_data['longitude'], location_data.get('elevation'))
             
-            current = weather_data['current']
-            daily = weather_data['daily']
-            hourly = weather_data['hourly']
-            current_aqi = aqi_data['current']['european_aqi']
+            if 'forecast' in errors:
+                st.error(f"Forecast error: {errors['forecast']}")
+                st.stop()
             
-            advisory = generate_smart_advisory(current, daily, current_aqi)
+            weather_data = results['forecast']
+            current = weather_data.current
+            daily = weather_data.daily
+            hourly = weather_data.hourly
+            
+            current_aqi = weather_core.current_aqi(results.get('air_quality'))
+            if 'air_quality' in errors:
+                # Render the forecast anyway, with the last archived AQI if there is one;
+                # otherwise the AQI-based advice falls through to its neutral branches
+                if current_aqi is not None:
+                    last_known_at = weather_data.local_datetime(results['air_quality']['last_known_at'])
+                    st.warning(f"Air quality data unavailable ({errors['air_quality']}); showing the last known reading from {last_known_at.strftime('%H:%M')}")
+                else:
+                    st.warning(f"Air quality data unavailable: {errors['air_quality']}")
+            
+            # Current is a frozen dataclass, so it compares by value: the same
+            # observation at the same place means nothing below needs rebuilding
+            view_inputs = (weather_data.latitude, weather_data.longitude, current, current_aqi)
+            advisory = memoized('advisory', view_inputs, lambda: generate_smart_advisory(
+                current, daily, float('nan') if current_aqi is None else current_aqi, hourly, weather_data.utc_offset_seconds
+            ))
             aqi_status, aqi_emoji = get_aqi_status(current_aqi)
+            render_clock = metrics.Stopwatch()
             
             # Metrics
             col1, col2, col3, col4 = st.columns(4)
@@ -397,120 +325,107 @@ else:
             with col4:
                 st.metric(
                     f"{aqi_emoji} Air Quality",
-                    current_aqi,
+                    current_aqi if current_aqi is not None else "N/A",
                     delta=aqi_status
                 )
             
             st.markdown("<br>", unsafe_allow_html=True)
+            render_clock.lap('render_metrics')
             
             # Advisory Sections
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.markdown("""
-                <div style='background-color: rgba(37, 99, 235, 0.1); border: 1px solid rgba(37, 99, 235, 0.3); border-radius: 12px; padding: 20px; height: 100%;'>
-                    <h3 style='color: #93c5fd; margin-top: 0; display: flex; align-items: center; gap: 8px;'>
-                        <span>👔</span> Daily Wardrobe
-                    </h3>
-                """, unsafe_allow_html=True)
-                for item in advisory['outfit']:
-                    st.markdown(f"<p style='font-size: 14px; line-height: 1.6; margin: 8px 0;'>• {item}</p>", unsafe_allow_html=True)
-                st.markdown("</div>", unsafe_allow_html=True)
-            
-            with col2:
-                st.markdown("""
-                <div style='background-color: rgba(245, 158, 11, 0.1); border: 1px solid rgba(245, 158, 11, 0.3); border-radius: 12px; padding: 20px; height: 100%;'>
-                    <h3 style='color: #fcd34d; margin-top: 0; display: flex; align-items: center; gap: 8px;'>
-                        <span>✨</span> Self Care Rituals
-                    </h3>
-                """, unsafe_allow_html=True)
-                for item in advisory['hygiene']:
-                    st.markdown(f"<p style='font-size: 14px; line-height: 1.6; margin: 8px 0;'>• {item}</p>", unsafe_allow_html=True)
-                st.markdown("</div>", unsafe_allow_html=True)
-            
-            with col3:
-                st.markdown("""
-                <div style='background-color: rgba(16, 185, 129, 0.1); border: 1px solid rgba(16, 185, 129, 0.3); border-radius: 12px; padding: 20px; height: 100%;'>
-                    <h3 style='color: #6ee7b7; margin-top: 0; display: flex; align-items: center; gap: 8px;'>
-                        <span>☕</span> Lifestyle & Diet
-                    </h3>
-                """, unsafe_allow_html=True)
-                for item in advisory['lifestyle']:
-                    st.markdown(f"<p style='font-size: 14px; line-height: 1.6; margin: 8px 0;'>• {item}</p>", unsafe_allow_html=True)
-                st.markdown("</div>", unsafe_allow_html=True)
-            
-            with col4:
-                st.markdown("""
-                <div style='background-color: rgba(139, 92, 246, 0.1); border: 1px solid rgba(139, 92, 246, 0.3); border-radius: 12px; padding: 20px; height: 100%;'>
-                    <h3 style='color: #c4b5fd; margin-top: 0; display: flex; align-items: center; gap: 8px;'>
-                        <span>🕐</span> Today's Routine
-                    </h3>
-                """, unsafe_allow_html=True)
-                for item in advisory['routine']:
-                    st.markdown(f"<p style='font-size: 14px; line-height: 1.6; margin: 8px 0;'>• {item}</p>", unsafe_allow_html=True)
-                st.markdown("</div>", unsafe_allow_html=True)
+            cards = memoized('advisory_cards', view_inputs, lambda: [
+                advisory_card(emoji, title, rgb, color, advisory[key]) for key, emoji, title, rgb, color in ADVISORY_CARDS
+            ])
+            for col, card in zip(st.columns(4), cards):
+                with col:
+                    st.markdown(card, unsafe_allow_html=True)
             
             st.markdown("<br>", unsafe_allow_html=True)
+            render_clock.lap('render_advisory')
             
             # Charts
             col1, col2 = st.columns([2, 1])
             
             with col1:
-                # Hourly Temperature Chart
-                hours = hourly['time'][:24]
-                temps = hourly['temperature_2m'][:24]
-                
-                if PLOTLY_AVAILABLE:
-                    fig = go.Figure()
-                    fig.add_trace(go.Scatter(
-                        x=[datetime.fromisoformat(h) for h in hours],
-                        y=temps,
-                        mode='lines',
-                        fill='tozeroy',
-                        line=dict(color='#60a5fa', width=3),
-                        fillcolor='rgba(96, 165, 250, 0.2)'
-                    ))
-                    
-                    fig.update_layout(
-                        title="24-Hour Temperature Forecast",
-                        xaxis_title="Time",
-                        yaxis_title="Temperature (°C)",
-                        height=300,
-                        plot_bgcolor='rgba(31, 41, 55, 0.3)',
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        font=dict(color='white'),
-                        xaxis=dict(showgrid=True, gridcolor='rgba(75, 85, 99, 0.3)'),
-                        yaxis=dict(showgrid=True, gridcolor='rgba(75, 85, 99, 0.3)')
-                    )
-                    
-                    st.plotly_chart(fig, use_container_width=True)
-                else:
-                    # Fallback to simple line chart
-                    st.markdown("### 📈 24-Hour Temperature Forecast")
-                    chart_data = pd.DataFrame({
-                        'Time': [datetime.fromisoformat(h) for h in hours],
-                        'Temperature (°C)': temps
-                    })
-                    st.line_chart(chart_data.set_index('Time'))
+                hourly_chart(weather_data)
             
             with col2:
+                forecast_km = weather_cache.distance_km(
+                    location_data['latitude'], location_data['longitude'], weather_data.latitude, weather_data.longitude
+                )
+                forecast_elevation = f", {weather_data.elevation:.0f} m" if weather_data.elevation is not None else ""
                 st.markdown(f"""
                 ### 📍 Location
                 **{location_data['name']}, {location_data.get('country', '')}**
                 
-                🌅 Sunrise: {datetime.fromisoformat(daily['sunrise'][0]).strftime('%H:%M')}  
-                🌇 Sunset: {datetime.fromisoformat(daily['sunset'][0]).strftime('%H:%M')}
+                🌅 Sunrise: {weather_data.local_datetime(daily['sunrise'][0]).strftime('%H:%M')}  
+                🌇 Sunset: {weather_data.local_datetime(daily['sunset'][0]).strftime('%H:%M')}
                 
                 📌 Lat: {location_data['latitude']:.2f}  
-                📌 Lon: {location_data['longitude']:.2f}
+                📌 Lon: {location_data['longitude']:.2f}  
+                📡 Forecast point: {weather_data.latitude:.2f}, {weather_data.longitude:.2f} ({forecast_km:.1f} km away{forecast_elevation})
                 """)
                 
                 # Map
                 map_url = f"https://www.openstreetmap.org/export/embed.html?bbox={location_data['longitude']-0.05}%2C{location_data['latitude']-0.05}%2C{location_data['longitude']+0.05}%2C{location_data['latitude']+0.05}&layer=mapnik&marker={location_data['latitude']}%2C{location_data['longitude']}"
                 st.markdown(f'<iframe width="100%" height="200" frameborder="0" scrolling="no" marginheight="0" marginwidth="0" src="{map_url}"></iframe>', unsafe_allow_html=True)
+                
+                saved_names = [saved['name'] for saved in st.session_state.saved_cities]
+                if location_data['name'] not in saved_names:
+                    st.button("⭐ Save city", use_container_width=True, on_click=save_city, args=(location_data,))
+            render_clock.lap('render_charts')
+            
+            # Trends (from the local archive, no extra API calls)
+            # Keyed on the cells that answered, which is where their history was archived
+            trend_cells = (results['cells']['forecast'], results['cells'].get('air_quality'))
+            trends = memoized('trends', trend_cells + view_inputs, lambda: weather_core.get_trends(
+                *trend_cells, weather_data.utc_offset_seconds
+            ))
+            if trends is not None:
+                st.markdown("### 📊 Trends")
+                col1, col2 = st.columns([1, 2])
+                
+                with col1:
+                    if trends['yesterday_temperature'] is not None:
+                        change = current['temperature_2m'] - trends['yesterday_temperature']
+                        st.metric(
+                            "🌡️ vs Yesterday",
+                            f"{change:+.1f}°C",
+                            delta=f"{'Warmer' if change > 0 else 'Cooler' if change < 0 else 'Same'} than this time yesterday",
+                            delta_color="off"
+                        )
+                    else:
+                        st.caption("Yesterday's comparison appears once this city has a day of history.")
+                
+                with col2:
+                    aqi_days, aqi_means = trends['aqi']
+                    if len(aqi_days):
+                        if PLOTLY_AVAILABLE:
+                            fig = memoized('trends_chart', trend_cells + view_inputs, lambda: charts.daily_aqi_figure(
+                                aqi_days, aqi_means, "Daily Average AQI (last 7 days)"
+                            ))
+                            st.plotly_chart(fig, use_container_width=True)
+                        else:
+                            import pandas as pd
+                            st.markdown("#### Daily Average AQI (last 7 days)")
+                            st.bar_chart(pd.DataFrame({'Day': aqi_days, 'AQI': aqi_means}).set_index('Day'))
+                render_clock.lap('render_trends')
+            
+            # Saved Cities Dashboard
+            if st.session_state.saved_cities:
+                saved_cities_dashboard()
             
             st.markdown("<br><br>", unsafe_allow_html=True)
             st.markdown("<div style='text-align: center; color: #6b7280; font-size: 12px;'>WeatherWise Pro v2.2 | Enhanced Advice Engine</div>", unsafe_allow_html=True)
             
+            # Debug Panel
+            if DEBUG_PANEL or st.query_params.get("debug") == "1":
+                with st.expander("🛠️ Debug metrics"):
+                    st.markdown("**Stage timings** (this process)")
+                    st.json(metrics.stage_summary())
+                    st.markdown("**Cache**")
+                    st.json(weather_cache.get_cache().stats())
+                    st.code(metrics.render(), language="text")
+            
         else:
             st.error(f"City '{st.session_state.city}' not found. Please try another city.")
@@ -0,0 +1,556 @@
+"""Shared forecast cache with pluggable backends and stale-while-revalidate.
+
+The backend is picked from ``WEATHERWISE_CACHE_URL``:
+
+* ``sqlite:///path/to/cache.sqlite3`` (default, in the temp dir) - shared by
+  every worker process on the box, survives restarts, reads are mmap-backed
+* ``redis://host:6379/0`` - any Redis-compatible server, shared by replicas
+* ``memory://`` - per-process dict, handy for development
+
+Entries are kept past their TTL for a stale window. A stale hit is returned
+straight away and refreshed on a background thread, so only the very first
+request for a location ever waits on upstream.
+
+Concurrent misses for the same key are coalesced: one caller fetches and the
+rest wait for its result. With a shared backend a short-lived lock entry
+extends that across worker processes (``WEATHERWISE_CACHE_LOCKS=0`` turns
+the cross-process part off).
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import metrics
+import ratelimit
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_URL = "sqlite:///" + os.path.join(tempfile.gettempdir(), "weatherwise-cache.sqlite3")
+
+# Open-Meteo's best-match models resolve to roughly 0.1 degree cells; points
+# inside the same cell get the same forecast, so they share one cache entry.
+GRID_RESOLUTION = float(os.environ.get("WEATHERWISE_GRID_RESOLUTION", "0.1"))
+
+# How long an expired entry may still be served while it is refreshed
+DEFAULT_MAX_STALE = 3600
+
+# Upper bound on one upstream fetch; a cross-process lock older than this is
+# considered abandoned and waiters fetch for themselves (a lock let go
+# without an entry, after a failed fetch, is taken over at the next poll)
+LOCK_TTL = 30
+LOCK_POLL_INTERVAL = 0.05
+
+
+def grid_cell(lat, lon, resolution=GRID_RESOLUTION):
+    """Snap a coordinate to the centre of its forecast grid cell."""
+    lat = (math.floor(lat / resolution) + 0.5) * resolution
+    lon = (math.floor(lon / resolution) + 0.5) * resolution
+    return round(lat, 4), round(lon, 4)
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two coordinates."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def nearby_cells(lat, lon, radius_km, resolution=GRID_RESOLUTION):
+    """(cell, distance_km) for every grid cell whose centre is within
+    ``radius_km`` of the point, nearest first.
+
+    The grid doubles as the spatial index: candidates are the cells in the
+    bounding box of the radius, so a lookup is a handful of exact key probes
+    rather than a search over everything cached.
+    """
+    lat_steps = math.ceil(radius_km / (resolution * 111.2)) + 1
+    # Degrees of longitude shrink towards the poles
+    lon_steps = math.ceil(radius_km / (resolution * 111.2 * max(math.cos(math.radians(lat)), 0.01))) + 1
+    centre_lat, centre_lon = grid_cell(lat, lon, resolution)
+    cells = []
+    for i in range(-lat_steps, lat_steps + 1):
+        for j in range(-lon_steps, lon_steps + 1):
+            cell = grid_cell(centre_lat + i * resolution, centre_lon + j * resolution, resolution)
+            distance = distance_km(lat, lon, *cell)
+            if distance <= radius_km:
+                cells.append((cell, distance))
+    cells.sort(key=lambda pair: pair[1])
+    return cells
+
+
+def location_key(namespace, lat, lon, params=None):
+    """Build a cache key; ``params`` are hashed in so changing the requested
+    variables never serves entries that lack them."""
+    if params:
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:8]
+        namespace = f"{namespace}-{digest}"
+    return f"{namespace}:{lat:.4f}:{lon:.4f}"
+
+
+def key_namespace(key):
+    """The metrics label for a key: 'forecast' for 'forecast-1a2b3c4d:12.95:77.55'."""
+    return key.split(':', 1)[0].split('-', 1)[0]
+
+
+# Backends store opaque payloads plus the two expiry timestamps.
+# get() returns (payload, fresh_until, stale_until) or None.
+
+class MemoryBackend:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[2] <= time.time():
+            return None
+        return entry
+
+    def set(self, key, payload, fresh_until, stale_until):
+        with self._lock:
+            self._entries[key] = (payload, fresh_until, stale_until)
+            if len(self._entries) % 256 == 0:
+                now = time.time()
+                self._entries = {k: e for k, e in self._entries.items() if e[2] > now}
+
+    # Nothing to share with other processes; in-process coalescing covers it
+    def acquire_lock(self, key, ttl):
+        return True
+
+    def release_lock(self, key):
+        pass
+
+
+class SQLiteBackend:
+    PRUNE_EVERY = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, payload BLOB NOT NULL, "
+            "fresh_until REAL NOT NULL, stale_until REAL NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, expires REAL NOT NULL)")
+        conn.commit()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT payload, fresh_until, stale_until FROM cache WHERE key = ? AND stale_until > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row
+
+    def set(self, key, payload, fresh_until, stale_until):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, payload, fresh_until, stale_until) VALUES (?, ?, ?, ?)",
+            (key, payload, fresh_until, stale_until),
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE stale_until <= ?", (time.time(),))
+        conn.commit()
+
+    def acquire_lock(self, key, ttl):
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute("DELETE FROM locks WHERE key = ? AND expires <= ?", (key, now))
+            cursor = conn.execute("INSERT OR IGNORE INTO locks (key, expires) VALUES (?, ?)", (key, now + ttl))
+        return cursor.rowcount == 1
+
+    def release_lock(self, key):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM locks WHERE key = ?", (key,))
+
+
+class RedisBackend:
+    _header = struct.Struct("!dd")
+    # Deletes a lock only while it still holds our token: once ours expired,
+    # the key may be another process's lock
+    _RELEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+    def __init__(self, url):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis:// cache URLs need the 'redis' package installed")
+        self.client = redis.Redis.from_url(url)
+        self._release = self.client.register_script(self._RELEASE)
+        # Lock key -> token of the lock this process holds on it
+        self._tokens = {}
+
+    def get(self, key):
+        raw = self.client.get(key)
+        if raw is None:
+            return None
+        fresh_until, stale_until = self._header.unpack_from(raw)
+        return raw[self._header.size:], fresh_until, stale_until
+
+    def set(self, key, payload, fresh_until, stale_until):
+        ttl_ms = max(1, int((stale_until - time.time()) * 1000))
+        self.client.set(key, self._header.pack(fresh_until, stale_until) + payload, px=ttl_ms)
+
+    def acquire_lock(self, key, ttl):
+        token = uuid.uuid4().hex
+        if not self.client.set(f"lock:{key}", token, nx=True, px=int(ttl * 1000)):
+            return False
+        self._tokens[key] = token
+        return True
+
+    def release_lock(self, key):
+        token = self._tokens.pop(key, None)
+        if token is not None:
+            self._release(keys=[f"lock:{key}"], args=[token])
+
+
+def create_backend(url):
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryBackend()
+    if parsed.scheme == "sqlite":
+        # sqlite:///relative.db or sqlite:////absolute/path.db
+        path = url[len("sqlite:///"):]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return SQLiteBackend(path)
+    if parsed.scheme in ("redis", "rediss", "unix"):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported cache URL: {url}")
+
+
+class _Flight:
+    """One in-progress fetch that other threads can wait on."""
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def result(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class SingleFlight:
+    """Collapse concurrent fetches of the same key within this process."""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def claim(self, keys):
+        """Split ``keys`` into ones this caller must fetch and ``{key: flight}``
+        already being fetched by another thread."""
+        led = []
+        joined = {}
+        with self._lock:
+            for key in keys:
+                flight = self._flights.get(key)
+                if flight is None:
+                    self._flights[key] = _Flight()
+                    led.append(key)
+                else:
+                    joined[key] = flight
+        return led, joined
+
+    def finish(self, key, value=None, error=None):
+        with self._lock:
+            flight = self._flights.pop(key, None)
+        if flight is not None:
+            flight.value = value
+            flight.error = error
+            flight.done.set()
+
+
+def _encode(value):
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+def _decode(payload):
+    return json.loads(payload)
+
+
+class Cache:
+    def __init__(self, backend, max_stale=DEFAULT_MAX_STALE, shared_locks=True):
+        self.backend = backend
+        self.max_stale = max_stale
+        self.shared_locks = shared_locks
+        self._flights = SingleFlight()
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="weatherwise-refresh")
+        # hit/stale/miss: lookup outcomes; fetched: keys we fetched upstream;
+        # coalesced: waited on another thread; coalesced_remote: filled in by
+        # another process while we waited
+        self._stats = dict.fromkeys(('hit', 'stale', 'miss', 'fetched', 'coalesced', 'coalesced_remote'), 0)
+        self._stats_lock = threading.Lock()
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, name, keys):
+        if keys:
+            with self._stats_lock:
+                self._stats[name] += len(keys)
+            metrics.CACHE_KEYS.inc(len(keys), namespace=key_namespace(keys[0]), result=name)
+
+    def get_or_fetch(self, key, fetch, ttl, encode=_encode, decode=_decode):
+        """Return the cached value for ``key``, calling ``fetch()`` on a miss.
+
+        Stale entries are returned immediately and refreshed in the background.
+        """
+        return self.get_or_fetch_many([key], lambda keys: [fetch()], ttl, encode, decode)[0]
+
+    def get_or_fetch_many(self, keys, fetch_many, ttl, encode=_encode, decode=_decode):
+        """Batch form of ``get_or_fetch``.
+
+        ``fetch_many(missing_keys)`` must return values in the same order, so
+        all misses cost one upstream call and all stale keys one more in the
+        background. Keys another caller is already fetching are waited on
+        rather than fetched again.
+        """
+        now = time.time()
+        values = {}
+        hits = []
+        stale = []
+        missing = []
+        for key in dict.fromkeys(keys):
+            entry = self._get(key)
+            if entry is None:
+                missing.append(key)
+                continue
+            payload, fresh_until, _ = entry
+            values[key] = decode(payload)
+            (stale if fresh_until <= now else hits).append(key)
+        self._count('hit', hits)
+        self._count('stale', stale)
+        self._count('miss', missing)
+        if stale:
+            self._refresh_in_background(stale, fetch_many, ttl, encode)
+        if missing:
+            values.update(self._fetch_missing(missing, fetch_many, ttl, encode, decode))
+        return [values[key] for key in keys]
+
+    def _fetch_missing(self, missing, fetch_many, ttl, encode, decode):
+        led, joined = self._flights.claim(missing)
+        values = {}
+        error = None
+        try:
+            if led:
+                values.update(self._fetch_led(led, fetch_many, ttl, encode, decode))
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            # Wake every waiter, with the result or with our failure
+            for key in led:
+                self._flights.finish(key, value=values.get(key), error=error)
+        self._count('coalesced', list(joined))
+        for key, flight in joined.items():
+            values[key] = flight.result()
+        return values
+
+    def _fetch_led(self, keys, fetch_many, ttl, encode, decode):
+        owned, elsewhere = self._lock_shared(keys)
+        try:
+            values = self._fetch_and_store(owned, fetch_many, ttl, encode)
+            if elsewhere:
+                values.update(self._wait_for_remote(elsewhere, fetch_many, ttl, encode, decode))
+            return values
+        finally:
+            self._unlock_shared(owned)
+
+    def _fetch_and_store(self, keys, fetch_many, ttl, encode):
+        values = {}
+        if keys:
+            self._count('fetched', keys)
+            for key, value in zip(keys, fetch_many(keys)):
+                self._store(key, value, ttl, encode)
+                values[key] = value
+        return values
+
+    def _wait_for_remote(self, keys, fetch_many, ttl, encode, decode):
+        # Another process holds the lock; poll for its result until the lock
+        # would have expired, then fetch whatever is still missing ourselves
+        values = {}
+        fetched = {}
+        pending = list(keys)
+        deadline = time.time() + LOCK_TTL
+        while pending and time.time() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            pending = self._collect(pending, values, decode)
+            # A free lock and still no entry means the holder failed and let
+            # go; take the lock over and fetch now rather than wait out LOCK_TTL
+            taken, pending = self._lock_shared(pending)
+            if taken:
+                try:
+                    # It may have stored just before letting go
+                    missing = self._collect(taken, values, decode)
+                    fetched.update(self._fetch_and_store(missing, fetch_many, ttl, encode))
+                finally:
+                    self._unlock_shared(taken)
+        self._count('coalesced_remote', list(values))
+        fetched.update(self._fetch_and_store(pending, fetch_many, ttl, encode))
+        values.update(fetched)
+        return values
+
+    def _collect(self, keys, values, decode):
+        """Decode cached ``keys`` into ``values``; returns the ones not cached."""
+        missing = []
+        for key in keys:
+            entry = self._get(key)
+            if entry is None:
+                missing.append(key)
+            else:
+                values[key] = decode(entry[0])
+        return missing
+
+    def _lock_shared(self, keys):
+        """Split ``keys`` into ones we hold the cross-process lock for and ones
+        another process is already fetching."""
+        if not self.shared_locks:
+            return list(keys), []
+        owned = []
+        elsewhere = []
+        for key in keys:
+            try:
+                locked = self.backend.acquire_lock(key, LOCK_TTL)
+            except Exception as e:
+                logger.warning("Cache lock failed for %s: %s", key, e)
+                locked = True
+            (owned if locked else elsewhere).append(key)
+        return owned, elsewhere
+
+    def _unlock_shared(self, keys):
+        if not self.shared_locks:
+            return
+        for key in keys:
+            try:
+                self.backend.release_lock(key)
+            except Exception as e:
+                logger.warning("Cache unlock failed for %s: %s", key, e)
+
+    def _get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            # A broken cache must never take the page down; fall back to upstream
+            logger.warning("Cache read failed for %s: %s", key, e)
+            return None
+
+    def _store(self, key, value, ttl, encode):
+        now = time.time()
+        try:
+            self.backend.set(key, encode(value), now + ttl, now + ttl + self.max_stale)
+        except Exception as e:
+            logger.warning("Cache write failed for %s: %s", key, e)
+
+    def peek(self, key, decode=_decode, fresh=False):
+        """The cached value for ``key``, fresh or (unless ``fresh``) stale, or
+        None; never fetches and isn't counted in the stats. Only a value
+        returned is decoded."""
+        entry = self._get(key)
+        if entry is None or (fresh and entry[1] <= time.time()):
+            return None
+        return decode(entry[0])
+
+    def expires_in(self, key):
+        """Seconds until ``key`` goes stale (negative once it has), or None if absent."""
+        entry = self._get(key)
+        if entry is None:
+            return None
+        return entry[1] - time.time()
+
+    def refresh(self, keys, fetch_many, ttl, encode=_encode):
+        """Fetch and store ``keys`` now, whatever their state, skipping any
+        already being refreshed here or in another process."""
+        keys = self._claim_refresh(keys)
+        if keys:
+            self._refresh(keys, fetch_many, ttl, encode)
+        return keys
+
+    def _claim_refresh(self, keys):
+        with self._refresh_lock:
+            keys = [key for key in keys if key not in self._refreshing]
+            self._refreshing.update(keys)
+        return keys
+
+    def _refresh_in_background(self, keys, fetch_many, ttl, encode):
+        keys = self._claim_refresh(keys)
+        if keys:
+            self._executor.submit(self._refresh, keys, fetch_many, ttl, encode)
+
+    def _refresh(self, keys, fetch_many, ttl, encode):
+        # Stale keys another process is already refreshing are left to it
+        owned, elsewhere = self._lock_shared(keys)
+        self._count('coalesced_remote', elsewhere)
+        try:
+            # Nobody is waiting on a refresh, so it yields to page views
+            with ratelimit.background():
+                self._fetch_and_store(owned, fetch_many, ttl, encode)
+        except Exception as e:
+            logger.warning("Background refresh failed for %s: %s", owned, e)
+        finally:
+            self._unlock_shared(owned)
+            with self._refresh_lock:
+                self._refreshing.difference_update(keys)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache configured by WEATHERWISE_CACHE_URL."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                url = os.environ.get("WEATHERWISE_CACHE_URL", DEFAULT_CACHE_URL)
+                shared_locks = os.environ.get("WEATHERWISE_CACHE_LOCKS", "1") != "0"
+                _cache = Cache(create_backend(url), shared_locks=shared_locks)
+    return _cache
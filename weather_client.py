@@ -0,0 +1,364 @@
+"""HTTP fetch layer for the Open-Meteo geocoding, forecast and air-quality APIs.
+
+All requests go through one pooled keep-alive session, and the forecast and
+air-quality calls for a location can be issued concurrently so a cold load
+costs roughly the slowest upstream call instead of the sum of them.
+
+Connection errors and 5xx answers are retried a bounded number of times with
+jittered exponential backoff. Each endpoint has a circuit breaker: after
+FAILURE_THRESHOLD consecutive failed calls it opens and calls fail at once
+with ``CircuitOpenError`` for RESET_TIMEOUT seconds, then a single trial call
+decides whether it closes again. Breakers are per process.
+
+Every attempt first takes its cost from the endpoint's shared rate limiter
+(see ratelimit), and a 429 pauses the endpoint for its Retry-After. A
+request costs what Open-Meteo counts it as: one call per location, times
+the variable count over 10 when more than 10 variables are asked for.
+"""
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import metrics
+import ratelimit
+
+logger = logging.getLogger(__name__)
+
+GEOCODING_URL = os.environ.get("WEATHERWISE_GEOCODING_URL", "https://geocoding-api.open-meteo.com/v1/search")
+FORECAST_URL = os.environ.get("WEATHERWISE_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+AIR_QUALITY_URL = os.environ.get("WEATHERWISE_AIR_QUALITY_URL", "https://air-quality-api.open-meteo.com/v1/air-quality")
+
+# (connect, read) timeouts per endpoint, in seconds
+TIMEOUTS = {
+    'geocoding': (3.05, 5),
+    'forecast': (3.05, 10),
+    'air_quality': (3.05, 6),
+}
+
+# Hourly variables the advisory timeline evaluates per hour; they ride along in
+# the same forecast call. Set WEATHERWISE_HOURLY_ADVISORY=0 to skip them.
+HOURLY_ADVISORY = os.environ.get("WEATHERWISE_HOURLY_ADVISORY", "1") != "0"
+HOURLY_VARIABLES = "temperature_2m,precipitation_probability"
+if HOURLY_ADVISORY:
+    HOURLY_VARIABLES += ",apparent_temperature,precipitation,relative_humidity_2m,wind_speed_10m,uv_index,is_day,weather_code"
+
+FORECAST_PARAMS = {
+    'current': "temperature_2m,relative_humidity_2m,apparent_temperature,is_day,precipitation,weather_code,wind_speed_10m",
+    'hourly': HOURLY_VARIABLES,
+    'daily': "sunrise,sunset,uv_index_max",
+    'timezone': "auto",
+}
+
+AIR_QUALITY_PARAMS = {
+    'current': "european_aqi",
+}
+
+
+def call_weight(params):
+    """API calls Open-Meteo counts for one location of a request with
+    ``params``: fractional above 10 variables (15 variables are 1.5 calls)."""
+    variables = sum(len(params[block].split(",")) for block in ('current', 'hourly', 'daily') if params.get(block))
+    return max(1.0, variables / 10)
+
+
+# Limiter cost of one location per endpoint
+CALL_WEIGHTS = {
+    'geocoding': 1.0,
+    'forecast': call_weight(FORECAST_PARAMS),
+    'air_quality': call_weight(AIR_QUALITY_PARAMS),
+}
+
+POOL_SIZE = 32
+# Threads running fetch_parallel calls: two per page view, for as many views
+# as the API server's 32 workers serve at once. Cache hits wait here too.
+FETCH_WORKERS = 64
+
+# Extra attempts after a retryable failure, and the backoff between them:
+# uniform in [0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+RETRIES = 2
+BACKOFF_BASE = 0.1
+BACKOFF_CAP = 1.0
+# No retry starts later than this many seconds after the first attempt
+RETRY_BUDGET = 2.0
+
+# Consecutive failed calls that open an endpoint's breaker, and how long it stays open
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30
+
+UPSTREAM_RETRIES = metrics.counter(
+    "weatherwise_upstream_retries_total", "Upstream requests retried after a transient failure.", ['endpoint'])
+CIRCUIT_TRANSITIONS = metrics.counter(
+    "weatherwise_circuit_transitions_total", "Circuit breaker state changes per endpoint.", ['endpoint', 'state'])
+
+# Locations per batched forecast/AQI request, keeps URLs a sane length
+MAX_BATCH = 100
+
+_session = None
+_session_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="weatherwise-fetch")
+
+
+def get_session():
+    """Return the process-wide keep-alive session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # Imported here so pages that never fetch don't pay for it
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, endpoint, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            if self.state == 'closed':
+                return
+            retry_in = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == 'open' and retry_in <= 0:
+                # Let exactly one trial call through
+                self._transition('half_open')
+                return
+            raise CircuitOpenError(
+                f"{self.endpoint} is unavailable, retrying in {max(retry_in, 0):.0f}s"
+            )
+
+    def abandon(self):
+        """The call allowed by ``before_call`` never went out; a half-open
+        breaker goes back to open, ready to let the next call try."""
+        with self._lock:
+            if self.state == 'half_open':
+                self._transition('open')
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self.state != 'closed':
+                self._transition('closed')
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition('open')
+
+    def _transition(self, state):
+        if state != self.state:
+            logger.warning("Circuit for %s is now %s", self.endpoint, state)
+        self.state = state
+        CIRCUIT_TRANSITIONS.inc(endpoint=self.endpoint, state=state)
+
+
+BREAKERS = {endpoint: CircuitBreaker(endpoint) for endpoint in TIMEOUTS}
+
+
+def circuit_states():
+    return {endpoint: breaker.state for endpoint, breaker in BREAKERS.items()}
+
+
+def fetch_json(endpoint, url, params, cost=None):
+    """GET ``url`` and decode the JSON body, with retries behind the endpoint's
+    breaker and within its rate limit. Every attempt costs ``cost`` calls of
+    the limit (one location of the endpoint by default)."""
+    breaker = BREAKERS[endpoint]
+    limiter = ratelimit.get_limiter()
+    cost = CALL_WEIGHTS[endpoint] if cost is None else cost
+    host = urlsplit(url).netloc
+    breaker.before_call()
+    try:
+        if limiter is not None:
+            limiter.acquire(endpoint, cost=cost, host=host)
+    except ratelimit.RateLimitedError:
+        breaker.abandon()
+        raise
+    first_attempt = time.monotonic()
+    attempt = 0
+    while True:
+        try:
+            data = _get_json(endpoint, url, params)
+        except Exception as e:
+            retry_after = _retry_after(e)
+            if retry_after is not None:
+                # Throttled: upstream is healthy, just over quota. The pause
+                # makes the next acquire() wait it out, here and elsewhere.
+                if limiter is not None:
+                    limiter.pause(endpoint, retry_after, host=host)
+                transient, counts_as_failure = True, False
+                backoff = retry_after if limiter is None else 0.0
+            else:
+                transient, counts_as_failure = _classify(e)
+                backoff = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            elapsed = time.monotonic() - first_attempt
+            if transient and attempt < RETRIES and elapsed + max(backoff, retry_after or 0) < RETRY_BUDGET:
+                attempt += 1
+                UPSTREAM_RETRIES.inc(endpoint=endpoint)
+                time.sleep(backoff)
+                try:
+                    if limiter is not None:
+                        limiter.acquire(endpoint, cost=cost, host=host)
+                    continue
+                except ratelimit.RateLimitedError:
+                    # No slot for the retry; the call fails with its own error
+                    pass
+            if counts_as_failure:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        breaker.record_success()
+        return data
+
+
+def _get_json(endpoint, url, params):
+    start = time.perf_counter()
+    try:
+        response = get_session().get(url, params=params, timeout=TIMEOUTS[endpoint])
+    except Exception:
+        metrics.UPSTREAM_RESPONSES.inc(endpoint=endpoint, status="error")
+        raise
+    finally:
+        metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+    metrics.UPSTREAM_RESPONSES.inc(endpoint=endpoint, status=str(response.status_code))
+    metrics.UPSTREAM_BYTES.observe(len(response.content), endpoint=endpoint)
+    response.raise_for_status()
+    return response.json()
+
+
+def _retry_after(error):
+    """Seconds to hold off for a 429 response, or None for any other error."""
+    response = getattr(error, 'response', None)
+    if response is None or response.status_code != 429:
+        return None
+    return ratelimit.parse_retry_after(response.headers.get('Retry-After'))
+
+
+def is_upstream_error(error):
+    """Whether ``error`` came from calling upstream (failed, throttled or
+    refused by its breaker) rather than from our own code."""
+    import requests
+
+    return isinstance(error, (requests.RequestException, CircuitOpenError, ratelimit.RateLimitedError))
+
+
+def _classify(error):
+    """(worth retrying, counts against the breaker) for a failed request."""
+    import requests
+
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else 0
+        # A 4xx is our request's fault; upstream itself is fine
+        return status >= 500, status >= 500
+    if isinstance(error, requests.ConnectTimeout):
+        return True, True
+    if isinstance(error, requests.Timeout):
+        # A read timeout already spent the whole budget; don't spend it again
+        return False, True
+    if isinstance(error, requests.ConnectionError):
+        return True, True
+    # Undecodable body and the like
+    return False, True
+
+
+def fetch_location(city_name):
+    data = fetch_json('geocoding', GEOCODING_URL, {
+        'name': city_name,
+        'count': 1,
+        'language': "en",
+        'format': "json",
+    })
+    if data.get('results'):
+        return data['results'][0]
+    return None
+
+
+def fetch_forecast(lat, lon):
+    return fetch_json('forecast', FORECAST_URL, {'latitude': lat, 'longitude': lon, **FORECAST_PARAMS})
+
+
+def fetch_air_quality(lat, lon):
+    return fetch_json('air_quality', AIR_QUALITY_URL, {'latitude': lat, 'longitude': lon, **AIR_QUALITY_PARAMS})
+
+
+def fetch_forecast_batch(points):
+    """Fetch forecasts for many (lat, lon) points, one request per MAX_BATCH points."""
+    return _fetch_batch('forecast', FORECAST_URL, FORECAST_PARAMS, points)
+
+
+def fetch_air_quality_batch(points):
+    return _fetch_batch('air_quality', AIR_QUALITY_URL, AIR_QUALITY_PARAMS, points)
+
+
+def _fetch_batch(endpoint, url, params, points):
+    results = []
+    for start in range(0, len(points), MAX_BATCH):
+        chunk = points[start:start + MAX_BATCH]
+        data = fetch_json(endpoint, url, {
+            'latitude': ",".join(str(lat) for lat, _ in chunk),
+            'longitude': ",".join(str(lon) for _, lon in chunk),
+            **params,
+        }, cost=len(chunk) * CALL_WEIGHTS[endpoint])
+        # Open-Meteo answers a single point with an object, several with a list
+        results.extend(data if isinstance(data, list) else [data])
+    return results
+
+
+def fetch_parallel(calls, timeouts=None):
+    """Run independent fetches concurrently.
+
+    ``calls`` maps a name to ``(func, *args)``. Returns ``(results, errors)``
+    dicts keyed by name, so one failing endpoint doesn't discard the others.
+    ``timeouts`` optionally caps, per name, the seconds to wait for a result;
+    past it the name gets a TimeoutError while the call carries on in the
+    background (and so still fills the cache for the next caller).
+    """
+    start = time.monotonic()
+    # Each call runs in a copy of the caller's context, so its priority carries over
+    futures = {
+        name: _executor.submit(contextvars.copy_context().run, call[0], *call[1:]) for name, call in calls.items()
+    }
+    results = {}
+    errors = {}
+    for name, future in futures.items():
+        limit = (timeouts or {}).get(name)
+        try:
+            results[name] = future.result(None if limit is None else max(0, start + limit - time.monotonic()))
+        except TimeoutError:
+            errors[name] = TimeoutError(f"{name} did not answer within {limit}s")
+        except Exception as e:
+            errors[name] = e
+    return results, errors
+
+
+def fetch_weather_bundle(lat, lon):
+    """Fetch forecast and air quality for one point at the same time."""
+    return fetch_parallel({
+        'forecast': (fetch_forecast, lat, lon),
+        'air_quality': (fetch_air_quality, lat, lon),
+    })
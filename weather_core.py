@@ -0,0 +1,361 @@
+"""WeatherWise core: lookups, cached fetches and advisories without any UI.
+
+Shared by the Streamlit page (weather_app.py) and the HTTP API
+(api_server.py). Importing this module must not pull in Streamlit, pandas
+or plotly.
+"""
+import os
+import time
+
+import advisory_engine
+import archive
+import forecast_model
+import geocoder
+import metrics
+import prefetch
+import weather_cache
+import weather_client
+
+GEOCODING_TTL = 3600
+FORECAST_TTL = 1800
+TREND_DAYS = 7
+# Air quality is optional on a page: stop waiting for it after this many
+# seconds and render without it (the fetch still completes into the cache)
+AQI_WAIT = 2.0
+# When air quality fails, an archived reading this recent stands in for it
+LAST_KNOWN_AQI_AGE = 6 * 3600
+# A point whose own grid cell isn't cached is served from a cached cell whose
+# centre is within NEARBY_KM, and (when both are known) whose elevation is
+# within NEARBY_ELEVATION_M of the point's; NEARBY_KM=0 turns this off. The
+# default is about the farthest a point can be from its own 0.1 degree
+# cell's centre, so a neighbour never answers from further than that could.
+NEARBY_KM = float(os.environ.get("WEATHERWISE_NEARBY_KM", "8"))
+NEARBY_ELEVATION_M = float(os.environ.get("WEATHERWISE_NEARBY_ELEVATION_M", "100"))
+
+NEARBY_HITS = metrics.counter(
+    "weatherwise_cache_nearby_total", "Points served from a neighbouring grid cell's cache entry.", ['namespace'])
+
+
+# Cache keys
+def geocoding_key(query):
+    return f"geocoding:{query}"
+
+
+def forecast_key(cell):
+    return weather_cache.location_key('forecast', *cell, weather_client.FORECAST_PARAMS)
+
+
+def aqi_key(cell):
+    return weather_cache.location_key('air_quality', *cell, weather_client.AIR_QUALITY_PARAMS)
+
+
+def fetch_locations(queries):
+    return [weather_client.fetch_location(query) for query in queries]
+
+
+def fetch_forecasts(cells):
+    # Cached and served in the compact form, never as the raw JSON
+    forecasts = [forecast_model.Forecast.from_json(data) for data in weather_client.fetch_forecast_batch(cells)]
+    store = archive.get_archive()
+    if store is not None:
+        for (lat, lon), forecast in zip(cells, forecasts):
+            store.record_forecast(lat, lon, forecast)
+    return forecasts
+
+
+def fetch_air_quality(cells):
+    results = weather_client.fetch_air_quality_batch(cells)
+    store = archive.get_archive()
+    if store is not None:
+        for (lat, lon), data in zip(cells, results):
+            store.record_air_quality(lat, lon, data)
+    return results
+
+
+# What the prefetcher keeps warm for popular cities, keyed like the page's lookups
+PREFETCH_TARGETS = {
+    'forecast': prefetch.Target(
+        forecast_key, fetch_forecasts, FORECAST_TTL, weather_client.MAX_BATCH, forecast_model.encode
+    ),
+    'air_quality': prefetch.Target(aqi_key, fetch_air_quality, FORECAST_TTL, weather_client.MAX_BATCH),
+    'geocoding': prefetch.Target(geocoding_key, fetch_locations, GEOCODING_TTL, 1),
+}
+
+
+def record_demand(kind, items):
+    prefetcher = prefetch.get_prefetcher(PREFETCH_TARGETS)
+    if prefetcher is not None:
+        for item in items:
+            prefetcher.record(kind, item)
+
+
+# Location lookup
+@metrics.timed('geocoding')
+def get_lat_lon(city_name):
+    # Answer from the offline index when we can; only misses go upstream
+    location = geocoder.lookup(city_name)
+    if location is None:
+        query = " ".join(city_name.split()).casefold()
+        record_demand('geocoding', [query])
+        location = weather_cache.get_cache().get_or_fetch(
+            geocoding_key(query), lambda: weather_client.fetch_location(query), ttl=GEOCODING_TTL
+        )
+    return location
+
+
+# Forecast and AQI go through the shared cross-process cache, keyed by grid cell
+def get_cached_points(kind, key_for, fetch_batch, points, elevations=None, elevation_of=None, **codec):
+    """Cached values for ``points`` plus the grid cell that answered each,
+    which may be a nearby cell rather than the point's own."""
+    # Misses across all points cost one batched upstream request
+    cache = weather_cache.get_cache()
+    cells = [weather_cache.grid_cell(lat, lon) for lat, lon in points]
+    if NEARBY_KM > 0:
+        cells = [
+            nearby_cached_cell(cache, key_for, point, cell, elevation, elevation_of)
+            for point, cell, elevation in zip(points, cells, elevations or [None] * len(points))
+        ]
+    record_demand(kind, cells)
+    keys = [key_for(cell) for cell in cells]
+    cell_for_key = dict(zip(keys, cells))
+    values = cache.get_or_fetch_many(
+        keys, lambda missing: fetch_batch([cell_for_key[key] for key in missing]), ttl=FORECAST_TTL, **codec
+    )
+    return values, cells
+
+
+def nearby_cached_cell(cache, key_for, point, cell, elevation=None, elevation_of=None):
+    """``cell`` itself when it is cached, else the nearest cell within the
+    NEARBY_KM / NEARBY_ELEVATION_M tolerance holding a fresh entry, else
+    ``cell`` (to fetch).
+
+    ``elevation_of`` reads the elevation off a cached payload. Each
+    candidate costs one cache read, and only a fresh entry is looked into.
+    """
+    if cache.expires_in(key_for(cell)) is not None:
+        return cell
+    for candidate, _ in weather_cache.nearby_cells(*point, NEARBY_KM):
+        if candidate == cell:
+            continue
+        key = key_for(candidate)
+        if elevation is None or elevation_of is None:
+            remaining = cache.expires_in(key)
+            if remaining is None or remaining <= 0:
+                continue
+        else:
+            # Wrapped, since a fresh entry's elevation may itself be None
+            found = cache.peek(key, lambda payload: (elevation_of(payload),), fresh=True)
+            if found is None:
+                continue
+            if found[0] is not None and abs(found[0] - elevation) > NEARBY_ELEVATION_M:
+                continue
+        NEARBY_HITS.inc(namespace=weather_cache.key_namespace(key))
+        return candidate
+    return cell
+
+
+@metrics.timed('forecast')
+def get_weather_cells(points, elevations=None):
+    """Forecasts for ``points`` as forecast_model.Forecast objects, plus the
+    grid cell each came from.
+
+    A point may be answered from a nearby cell's cached forecast; that cell
+    is the one whose archive holds the point's history. ``elevations``
+    (metres, or None per point) tighten that to similar terrain.
+    """
+    return get_cached_points(
+        'forecast', forecast_key, fetch_forecasts, points, elevations, forecast_model.peek_elevation,
+        encode=forecast_model.encode, decode=forecast_model.decode,
+    )
+
+
+@metrics.timed('air_quality')
+def get_aqi_cells(points):
+    return get_cached_points('air_quality', aqi_key, fetch_air_quality, points)
+
+
+def get_weather_batch(points, elevations=None):
+    return get_weather_cells(points, elevations)[0]
+
+
+def get_aqi_batch(points):
+    return get_aqi_cells(points)[0]
+
+
+def get_weather_data(lat, lon, elevation=None):
+    return get_weather_batch([(lat, lon)], [elevation])[0]
+
+
+def get_aqi_data(lat, lon):
+    return get_aqi_batch([(lat, lon)])[0]
+
+
+def get_weather_and_aqi(lat, lon, elevation=None):
+    """Forecast and air quality for one point.
+
+    ``results['cells']`` maps each to the grid cell that answered it (what
+    ``get_trends`` takes); for failed air quality, the cell of the last
+    known reading standing in for it.
+    """
+    # Forecast and air quality are independent, so fetch them side by side
+    results, errors = weather_client.fetch_parallel({
+        'forecast': (get_weather_cells, [(lat, lon)], [elevation]),
+        'air_quality': (get_aqi_cells, [(lat, lon)]),
+    }, timeouts={'air_quality': AQI_WAIT})
+    cells = {}
+    for name, (values, answered) in list(results.items()):
+        results[name], cells[name] = values[0], answered[0]
+    if 'air_quality' in errors:
+        fallback = last_known_aqi([(lat, lon)])[0]
+        if fallback is not None:
+            results['air_quality'] = fallback
+            cells['air_quality'] = fallback['cell']
+    results['cells'] = cells
+    return results, errors
+
+
+def get_conditions_batch(locations):
+    # Any number of locations in one batched request per endpoint
+    points = [(location['latitude'], location['longitude']) for location in locations]
+    elevations = [location.get('elevation') for location in locations]
+    results, errors = weather_client.fetch_parallel({
+        'forecast': (get_weather_cells, points, elevations),
+        'air_quality': (get_aqi_cells, points),
+    }, timeouts={'air_quality': AQI_WAIT})
+    cells = {}
+    for name, (values, answered) in list(results.items()):
+        results[name], cells[name] = values, answered
+    if 'air_quality' in errors:
+        results['air_quality'] = last_known_aqi(points)
+        cells['air_quality'] = [fallback and fallback['cell'] for fallback in results['air_quality']]
+    results['cells'] = cells
+    return results, errors
+
+
+def last_known_aqi(points, max_age=LAST_KNOWN_AQI_AGE):
+    """Degraded-mode stand-ins for air-quality responses, from the archive.
+
+    Each is ``{'current': {'european_aqi': ...}, 'last_known_at': epoch,
+    'cell': (lat, lon)}`` or None when nothing recent enough was archived
+    for that point. Like the live lookup, a point whose own cell has no
+    readings uses the nearest cell within NEARBY_KM that has; its readings
+    were archived there while it answered for the point. The caller's
+    ``errors['air_quality']`` still says why the live value is missing.
+    """
+    store = archive.get_archive()
+    if store is None:
+        return [None] * len(points)
+    now = time.time()
+    fallbacks = []
+    for lat, lon in points:
+        fallback = None
+        for cell in archive_cells(lat, lon):
+            rows = store.query('aqi', *cell, now - max_age, now + archive.HOUR)
+            rows = rows[rows['european_aqi'] == rows['european_aqi']]
+            if len(rows):
+                fallback = {
+                    'current': {'european_aqi': int(rows['european_aqi'][-1])},
+                    'last_known_at': int(rows['time'][-1]),
+                    'cell': cell,
+                }
+                break
+        fallbacks.append(fallback)
+    return fallbacks
+
+
+def archive_cells(lat, lon):
+    """Cells that may hold a point's archived readings, in order of preference."""
+    cell = weather_cache.grid_cell(lat, lon)
+    if NEARBY_KM <= 0:
+        return [cell]
+    return [cell] + [candidate for candidate, _ in weather_cache.nearby_cells(lat, lon, NEARBY_KM) if candidate != cell]
+
+
+# Trends come from the local archive of past fetches, never from new API calls
+@metrics.timed('trends')
+def get_trends(forecast_cell, aqi_cell=None, utc_offset=0, days=TREND_DAYS):
+    """Daily mean temperature and AQI for the last ``days`` local days, plus
+    the archived temperature at this time yesterday (None if not archived).
+
+    The cells are the ones that answered the page's lookups (see
+    ``get_weather_and_aqi``), since that is where the fetches were archived;
+    ``aqi_cell`` defaults to ``forecast_cell``. Returns None when the
+    archive is disabled.
+    """
+    store = archive.get_archive()
+    if store is None:
+        return None
+    now = time.time()
+    start = now - days * archive.DAY
+    hourly = store.query('hourly', *forecast_cell, start, now + archive.HOUR)
+    aqi = store.query('aqi', *(aqi_cell or forecast_cell), start, now + archive.HOUR)
+    hour_yesterday = (int(now) // archive.HOUR) * archive.HOUR - archive.DAY
+    yesterday = [float(t) for t in hourly['temperature_2m'][hourly['time'] == hour_yesterday] if t == t]
+    return {
+        'yesterday_temperature': yesterday[0] if yesterday else None,
+        'temperature': archive.daily_means(hourly, 'temperature_2m', utc_offset),
+        'aqi': archive.daily_means(aqi, 'european_aqi', utc_offset),
+    }
+
+
+# Advisory Generation Logic
+@metrics.timed('advisory')
+def generate_smart_advisory(current, daily, aqi, hourly=None, utc_offset=0):
+    # Rules live as tables in advisory_engine so batch jobs can evaluate them vectorized
+    advisory = advisory_engine.evaluate_row(advisory_engine.row_from_conditions(current, daily, aqi))
+    if hourly is not None and advisory_engine.has_hourly_columns(hourly):
+        # Judge each routine slot on the forecast for its next occurrence;
+        # with hourly data, current['time'] is epoch seconds
+        routine = advisory_engine.hourly_routine(hourly, aqi, utc_offset=utc_offset, now=current['time'])
+        if routine is not None:
+            advisory['routine'] = routine
+    return advisory
+
+
+def get_aqi_status(aqi_value):
+    if aqi_value is None:
+        return "Unavailable", "⚪"
+    elif aqi_value < 40:
+        return "Good", "🟢"
+    elif aqi_value < 80:
+        return "Moderate", "🟡"
+    else:
+        return "Poor", "🔴"
+
+
+def current_aqi(air_quality):
+    if not air_quality:
+        return None
+    return air_quality['current']['european_aqi']
+
+
+def forecast_advisory(forecast, aqi):
+    """``generate_smart_advisory`` for a Forecast; ``aqi`` may be None."""
+    return generate_smart_advisory(
+        forecast.current, forecast.daily, float('nan') if aqi is None else aqi,
+        forecast.hourly, forecast.utc_offset_seconds,
+    )
+
+
+def advisory_report(location, forecast, air_quality):
+    """Everything a client needs to render one location, as plain JSON data.
+
+    ``air_quality`` may be None, or a ``last_known_aqi`` stand-in, when that
+    upstream failed.
+    """
+    aqi = current_aqi(air_quality)
+    status, emoji = get_aqi_status(aqi)
+    return {
+        'location': location,
+        'current': forecast.current_json(),
+        # Which forecast grid point answered, possibly a nearby cached one
+        'forecast_point': {
+            'latitude': forecast.latitude, 'longitude': forecast.longitude, 'elevation': forecast.elevation,
+        },
+        'aqi': aqi,
+        'aqi_status': status,
+        'aqi_emoji': emoji,
+        # Set when ``aqi`` is an archived reading standing in for a failed fetch
+        'aqi_last_known_at': air_quality.get('last_known_at') if air_quality else None,
+        'advisory': forecast_advisory(forecast, aqi),
+    }